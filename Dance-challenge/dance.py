@@ -5,6 +5,8 @@ Created on Sun May  8 13:08:32 2022
 @author: pc
 """
 
+import os
+import sys
 import pgzrun
 import pygame
 import pgzero
@@ -13,6 +15,17 @@ import matplotlib.animation as animate
 from pgzero.builtins import Actor
 from random import randint
 
+#load the sprites from the atlas, if build_atlas.py has made one;
+#atlas.py is in the folder above this game's folder (pgzero's loader
+#root; __file__ is pgzero's own after "import pgzrun")
+sys.path.append(os.path.join(pgzero.loaders.root, os.pardir))
+try:
+    import atlas
+except ImportError:
+    pass
+else:
+    atlas.install()
+
 WIDTH = 800
 HEIGHT = 600
 CENTER_X = WIDTH / 2
@@ -5,12 +5,22 @@ Created on Fri Apr 22 17:02:15 2022
 @author: pc
 """
 
+import os
+import sys
+
 import heartpy as hp
 import matplotlib.pyplot as plt
+import numpy as np
 
-sample_rate = 400
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'wavfile'))
+from wav2csv import load_samples
 
-data = hp.get_data('h1_filter_Output_mono.csv')
+#the recording as converted by wavfile/wav2csv.py:
+#    python wav2csv.py h1_filter.wav --output ../EE104-Lab7/h1_filter
+#the .npy file is memory-mapped instead of parsed from text, and the
+#sample rate comes from the .json file next to it
+sample_rate, data = load_samples('h1_filter.npy')
+data = np.asarray(data, dtype=np.float64)
 
 plt.figure(figsize=(12,4))
 plt.plot(data)
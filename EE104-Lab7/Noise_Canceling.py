@@ -6,8 +6,8 @@ Created on Mon Apr 18 21:24:42 2022
 """
 
 import numpy as np
-from scipy import fftpack
 from matplotlib import pyplot as plt
+from fft_filter import FFTFilter, power_spectrum
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -36,14 +36,9 @@ plt.plot(time_vec, sig, label='Three Different Frequency')
 
 
 # Compute and plot the power
-# The FFT of the signal
-sig_fft = fftpack.fft(sig)
-
-# And the power (sig_fft is of complex dtype)
-power = np.abs(sig_fft)**2
-
-# The corresponding frequencies
-sample_freq = fftpack.fftfreq(sig.size, d=time_step)
+# The signal is real, so the power at negative frequencies mirrors the
+# positive ones and we only compute the non-negative half
+sample_freq, power = power_spectrum(sig, d=time_step)
 
 # Plot the FFT power
 plt.figure(figsize=(30, 20))
@@ -52,19 +47,17 @@ plt.xlabel('Frequency [Hz]')
 plt.ylabel('plower')
 
 # Find the peak frequency: we can focus on only the positive frequencies
-pos_mask = np.where(sample_freq > 0)
-freqs = sample_freq[pos_mask]
-peak_freq = freqs[power[pos_mask].argmax()]
+# (skipping the zero frequency)
+peak_freq = sample_freq[1:][power[1:].argmax()]
 peak_freq
 
 
 # Remove all the high frequencies
 # We now remove all the high frequencies and transform back from
-# frequencies to signal.
+# frequencies to signal.  The result is real.
 
-high_freq_fft = sig_fft.copy()
-high_freq_fft[np.abs(sample_freq) > peak_freq] = 0
-filtered_sig = fftpack.ifft(high_freq_fft)
+lowpass = FFTFilter('lowpass', peak_freq, d=time_step, pad=False)
+filtered_sig = lowpass(sig)
 
 plt.figure(figsize=(60,10))
 plt.plot(time_vec, sig, label='Original signal')
@@ -74,16 +67,8 @@ plt.ylabel('Amplitude')
 
 plt.legend(loc='best')
 
-# Double check: Re-Compute and plot the power
-#sig = filtered_sig
-# The FFT of the signal
-sig_fft1 = fftpack.fft(filtered_sig)
-
-# And the power (sig_fft is of complex dtype)
-power = np.abs(sig_fft1)**2
-
-# The corresponding frequencies
-sample_freq = fftpack.fftfreq(filtered_sig.size, d=time_step)
+# Double check: Re-Compute and plot the power of the filtered signal
+sample_freq, power = power_spectrum(filtered_sig, d=time_step)
 
 # Plot the FFT power
 plt.figure(figsize=(30, 20))
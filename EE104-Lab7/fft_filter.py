@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+FFT filters for real signals, used by Noise_Canceling.py.
+
+FFTFilter zeroes the frequency bins outside (or, for a notch, inside)
+the pass band and transforms back.  Because the signals are real, it
+uses rfft/irfft, which compute half the spectrum and return a real
+signal.  Signals are zero-padded to a fast FFT length, and the mask and
+the padded input buffer are kept for each length, so filtering many
+segments of the same length does no setup work after the first one.
+
+Example:
+
+    lowpass = FFTFilter('lowpass', 5, d=time_step)
+    for segment in segments:
+        filtered = lowpass(segment)
+"""
+
+import numpy as np
+from scipy import fft
+
+MODES = ('lowpass', 'highpass', 'bandpass', 'notch')
+
+
+def power_spectrum(sig, d=1.0, workers=None):
+    """Computes the power at non-negative frequencies.
+
+    Works along the last axis, so sig can hold several signals.
+
+    sig: real signal
+    d: time between samples
+
+    returns: frequencies, power
+    """
+    sig_fft = fft.rfft(sig, axis=-1, workers=workers)
+    power = np.abs(sig_fft)**2
+    freqs = fft.rfftfreq(sig.shape[-1], d=d)
+    return freqs, power
+
+
+def peak_frequency(sig, d=1.0, workers=None):
+    """Finds the positive frequency with the most power.
+
+    sig: real signal, or array of signals along the last axis
+    d: time between samples
+
+    returns: frequency, or array of frequencies
+    """
+    freqs, power = power_spectrum(sig, d, workers)
+    # skip the zero frequency
+    return freqs[1:][power[..., 1:].argmax(axis=-1)]
+
+
+def frequency_mask(freqs, mode, cutoff):
+    """Decides which frequency bins a filter keeps.
+
+    cutoff can be an array, one cutoff (or one (low, high) pair) per
+    signal, to make a separate mask for each signal.
+
+    freqs: array of frequencies
+    mode: 'lowpass', 'highpass', 'bandpass' or 'notch'
+    cutoff: frequency, or (low, high), or an array of either
+
+    returns: boolean array, True for bins to keep; shape is
+             cutoff's shape (without the pair axis) + freqs' shape
+    """
+    cutoff = np.asarray(cutoff, dtype=np.float64)
+    if mode == 'lowpass':
+        return freqs <= cutoff[..., np.newaxis]
+    if mode == 'highpass':
+        return freqs >= cutoff[..., np.newaxis]
+    if mode in ('bandpass', 'notch'):
+        low = cutoff[..., 0, np.newaxis]
+        high = cutoff[..., 1, np.newaxis]
+        keep = (freqs >= low) & (freqs <= high)
+        return keep if mode == 'bandpass' else ~keep
+    raise ValueError('mode should be one of ' + ', '.join(MODES))
+
+
+class FFTFilter:
+    """Low-pass, high-pass, band-pass or notch filter in the frequency domain."""
+
+    def __init__(self, mode, cutoff, d=1.0, pad=True, workers=None):
+        """
+        mode: 'lowpass', 'highpass', 'bandpass' or 'notch'
+        cutoff: frequency for 'lowpass' and 'highpass';
+                (low, high) for 'bandpass' and 'notch'
+        d: time between samples
+        pad: whether to zero-pad signals to a fast FFT length
+        workers: number of threads for the FFT, see scipy.fft
+        """
+        if mode not in MODES:
+            raise ValueError('mode should be one of ' + ', '.join(MODES))
+        if mode in ('bandpass', 'notch'):
+            low, high = cutoff
+            if low > high:
+                raise ValueError('cutoff should be (low, high)')
+
+        self.mode = mode
+        self.cutoff = cutoff
+        self.d = d
+        self.pad = pad
+        self.workers = workers
+        self._masks = {}
+        self._buffers = {}
+
+    def fft_length(self, n):
+        """Length of the FFT used for signals with n samples."""
+        return fft.next_fast_len(n, real=True) if self.pad else n
+
+    def mask(self, n_fft):
+        """Returns the mask for the rfft of length n_fft: 1 to keep a bin, 0 to zero it.
+
+        Masks are computed once per length and shared; don't modify them.
+        """
+        mask = self._masks.get(n_fft)
+        if mask is None:
+            freqs = fft.rfftfreq(n_fft, d=self.d)
+            keep = frequency_mask(freqs, self.mode, self.cutoff)
+            mask = keep.astype(np.float64)
+            mask.flags.writeable = False
+            self._masks[n_fft] = mask
+        return mask
+
+    def _buffer(self, shape):
+        """Returns the input buffer for signals with the given padded shape."""
+        buf = self._buffers.get(shape)
+        if buf is None:
+            buf = self._buffers[shape] = np.zeros(shape)
+        return buf
+
+    def apply(self, sig, out=None):
+        """Filters a real signal along its last axis.
+
+        sig: array of samples; can have more than one dimension
+        out: optional array for the result, same shape as sig
+
+        returns: filtered signal, same shape as sig
+        """
+        sig = np.asarray(sig)
+        n = sig.shape[-1]
+        n_fft = self.fft_length(n)
+
+        # copy into the padded buffer; the FFT is allowed to overwrite it
+        buf = self._buffer(sig.shape[:-1] + (n_fft,))
+        buf[..., :n] = sig
+        buf[..., n:] = 0
+
+        spectrum = fft.rfft(buf, axis=-1, overwrite_x=True, workers=self.workers)
+        spectrum *= self.mask(n_fft)
+        filtered = fft.irfft(spectrum, n=n_fft, axis=-1, overwrite_x=True,
+                             workers=self.workers)
+
+        if out is None:
+            return filtered[..., :n]
+        out[...] = filtered[..., :n]
+        return out
+
+    __call__ = apply
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Batch version of Heart_Rate_Analysis.py.
+
+Runs hp.process on every recording that matches the inputs, spread
+over a pool of processes, and writes the measures for all of them to
+one CSV file, one row per recording.  Nothing is plotted.
+
+Each row also records how long the file took and, if the analysis
+failed, the error message, so one bad recording does not stop the run.
+Rows are written as the files finish, so they are in the order the
+files finished, and a run that is stopped keeps the rows it has.
+
+Inputs can be directories, file names or glob patterns, for .wav,
+.csv, .npy and .npz files.  .wav files carry their own sample rate,
+and so do .npy files converted by wavfile/wav2csv.py (in the .json
+file next to them) and .npz files; for the rest, --sample-rate is used.
+They are read with load_samples() from wavfile/wav2csv.py.
+
+Usage:
+
+    python heart_rate_batch.py recordings/ -o measures.csv
+    python heart_rate_batch.py "night/**/*.npy" --workers 32
+"""
+
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# no windows from the workers
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import heartpy as hp
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'wavfile'))
+from wav2csv import load_samples
+
+EXTENSIONS = ('.wav', '.csv', '.npy', '.npz')
+
+# the measures hp.process returns, in the order it returns them
+MEASURES = ['bpm', 'ibi', 'sdnn', 'sdsd', 'rmssd', 'pnn20', 'pnn50', 'hr_mad',
+            'sd1', 'sd2', 's', 'sd1/sd2', 'breathingrate']
+
+FIELDS = ['file', 'status', 'error', 'seconds', 'sample_rate'] + MEASURES
+
+sample_rate = 400
+
+
+def find_files(inputs):
+    """Expands directories and glob patterns into a sorted list of files."""
+    files = []
+    for name in inputs:
+        if os.path.isdir(name):
+            matches = [os.path.join(name, entry) for entry in os.listdir(name)]
+        else:
+            matches = glob.glob(name, recursive=True) or [name]
+        files.extend(match for match in matches
+                     if match.lower().endswith(EXTENSIONS))
+    return sorted(set(files))
+
+
+def load_recording(filename, default_rate=sample_rate):
+    """Reads one recording.
+
+    Multichannel recordings are reduced to their first channel.
+
+    returns: data array, sample rate
+    """
+    rate, data = load_samples(filename)
+    if rate is None:
+        rate = default_rate
+    if data.ndim > 1:
+        data = data[:, 0]
+    return np.asarray(data, dtype=np.float64), rate
+
+
+def analyze(filename, default_rate=sample_rate):
+    """Runs the analysis on one file; never raises.
+
+    returns: dictionary with the file name, timing, status and measures
+    """
+    start = time.perf_counter()
+    row = dict(file=filename, status='ok', error='', sample_rate='')
+    try:
+        data, rate = load_recording(filename, default_rate)
+        row['sample_rate'] = rate
+        wd, m = hp.process(data, rate)
+        for measure in m.keys():
+            row[measure] = float(m[measure])
+    except Exception as e:
+        row['status'] = 'failed'
+        # one line per file in the results
+        row['error'] = '%s: %s' % (type(e).__name__, ' '.join(str(e).split()))
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+
+def analyze_chunk(filenames, default_rate=sample_rate):
+    """Runs the analysis on several files in one process."""
+    return [analyze(filename, default_rate) for filename in filenames]
+
+
+def run_batch(files, output, default_rate=sample_rate, workers=None, chunksize=1):
+    """Analyzes all files and writes one row per file to `output`.
+
+    Each row is written, and flushed, as soon as its file is done.
+
+    returns: list of result rows, in the same order as files
+    """
+    rows = {}
+    with open(output, 'w', newline='') as file:
+        # measures that hp.process might add in a later version are left out
+        writer = csv.DictWriter(file, fieldnames=FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        file.flush()
+
+        def write(chunk):
+            for row in chunk:
+                rows[row['file']] = row
+                writer.writerow(row)
+            file.flush()
+
+        if workers == 1:
+            for filename in files:
+                write([analyze(filename, default_rate)])
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(analyze_chunk, files[i:i + chunksize], default_rate)
+                           for i in range(0, len(files), chunksize)]
+                for future in as_completed(futures):
+                    write(future.result())
+    return [rows[filename] for filename in files]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Heart rate analysis for many recordings.')
+    parser.add_argument('inputs', nargs='+', help='directories, files or glob patterns')
+    parser.add_argument('-o', '--output', default='heart_rate_measures.csv',
+                        help='CSV file for the results')
+    parser.add_argument('--sample-rate', type=float, default=sample_rate,
+                        help='sample rate for files that do not record one')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes (default: one per CPU)')
+    parser.add_argument('--chunksize', type=int, default=1,
+                        help='files sent to a process at a time')
+    options = parser.parse_args(args)
+
+    # don't read back the results of an earlier run
+    output = os.path.abspath(options.output)
+    files = [name for name in find_files(options.inputs)
+             if os.path.abspath(name) != output]
+    if not files:
+        print('No recordings found')
+        return 1
+
+    start = time.perf_counter()
+    rows = run_batch(files, options.output, options.sample_rate,
+                     options.workers, options.chunksize)
+    elapsed = time.perf_counter() - start
+
+    failed = [row for row in rows if row['status'] != 'ok']
+    print('%d files in %.1f s, %d failed; results in %s'
+          % (len(rows), elapsed, len(failed), options.output))
+    for row in failed:
+        print('  %s: %s' % (row['file'], row['error']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Real-time version of Heart_Rate_Analysis.py.
+
+HeartRateMonitor takes samples as they arrive, and every `hop` seconds
+reports BPM and HRV measures for the peaks in the last `window`
+seconds, with the same names heartpy uses.
+
+A peak is the highest point of each stretch of signal above its moving
+average, as in heartpy, except that the moving average here is over the
+preceding `windowsize` seconds only (heartpy centres it on each sample,
+which needs samples that haven't arrived yet).  So peaks can differ a
+little from hp.process on the same recording.  Only the new samples of
+each hop are examined; peaks found earlier are kept and dropped when
+they leave the window, so the work per hop does not grow with the
+window length.
+
+Samples can come from a generator, a pipe, or a file that is still
+being written:
+
+    python heart_rate_monitor.py h1_filter_Output_mono.csv
+    python heart_rate_monitor.py live.csv --follow
+    sensor_reader | python heart_rate_monitor.py - --hop 0.5
+"""
+
+import argparse
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+sample_rate = 400
+
+
+class HeartRateMonitor:
+    """Sliding-window heart rate analysis of a stream of samples."""
+
+    def __init__(self, sample_rate=sample_rate, window=10.0, hop=1.0,
+                 windowsize=0.75, min_interval=0.3, max_interval=2.0):
+        """
+        sample_rate: samples per second
+        window: length of the analysis window in seconds
+        hop: time between updates in seconds
+        windowsize: length of the moving average in seconds, as in hp.process
+        min_interval: shortest possible time between beats in seconds
+        max_interval: longer intervals are treated as missed beats
+        """
+        self.sample_rate = sample_rate
+        self.window_samples = int(window * sample_rate)
+        self.hop_samples = int(hop * sample_rate)
+        if not 0 < self.hop_samples <= self.window_samples:
+            raise ValueError('need 0 < hop <= window, at least one sample each; got '
+                             'hop=%g s (%d samples), window=%g s (%d samples)'
+                             % (hop, self.hop_samples, window, self.window_samples))
+        self.ma_samples = max(int(windowsize * sample_rate), 1)
+        self.min_gap = int(min_interval * sample_rate)
+        self.max_interval_ms = max_interval * 1000
+
+        # samples processed so far
+        self.n_seen = 0
+
+        # samples waiting for a full hop
+        self.pending = np.zeros(self.hop_samples)
+        self.n_pending = 0
+
+        # the last ma_samples-1 samples, for the moving average
+        self.tail = None
+
+        # the stretch above the moving average that is still open
+        self.in_region = False
+        self.region_max = -np.inf
+        self.region_peak = -1
+
+        # peaks in the window: absolute sample numbers and heights
+        self.peaks = deque()
+        self.peak_values = deque()
+
+    def push(self, samples):
+        """Adds new samples.
+
+        samples: number or array of numbers
+
+        returns: list of measures, one dictionary per completed hop
+        """
+        samples = np.atleast_1d(np.asarray(samples, dtype=np.float64))
+        results = []
+        while len(samples):
+            n = min(self.hop_samples - self.n_pending, len(samples))
+            self.pending[self.n_pending:self.n_pending + n] = samples[:n]
+            self.n_pending += n
+            samples = samples[n:]
+            if self.n_pending == self.hop_samples:
+                results.append(self.process_hop(self.pending))
+                self.n_pending = 0
+        return results
+
+    def run(self, source):
+        """Feeds every chunk from an iterable of samples or arrays.
+
+        yields: measures, one dictionary per hop
+        """
+        for chunk in source:
+            for measures in self.push(chunk):
+                yield measures
+
+    def process_hop(self, x):
+        """Updates the peaks and the measures for one hop.
+
+        returns: dictionary of measures
+        """
+        start_time = time.perf_counter()
+        n = len(x)
+        offset = self.n_seen
+
+        # moving average over the new samples, continuing from the last hop
+        if self.tail is None:
+            self.tail = np.full(self.ma_samples - 1, x.mean())
+        extended = np.concatenate((self.tail, x))
+        cumsum = np.cumsum(np.insert(extended, 0, 0))
+        ma = (cumsum[self.ma_samples:] - cumsum[:-self.ma_samples]) / self.ma_samples
+        self.tail = extended[len(extended) - (self.ma_samples - 1):]
+
+        # find where stretches above the moving average start and end
+        above = (x > ma).astype(np.int8)
+        edges = np.diff(np.concatenate(([int(self.in_region)], above)))
+        bounds = np.flatnonzero(edges)
+        if self.in_region:
+            bounds = np.concatenate(([0], bounds))
+        if len(bounds) % 2:
+            bounds = np.concatenate((bounds, [n]))
+
+        for s, e in zip(bounds[0::2], bounds[1::2]):
+            if s > 0 or not self.in_region:
+                self.region_max = -np.inf
+            # a stretch carried over from the last hop can end right away
+            if e > s:
+                i = s + np.argmax(x[s:e])
+                if x[i] > self.region_max:
+                    self.region_max = x[i]
+                    self.region_peak = offset + i
+            if e < n:
+                self.add_peak(self.region_peak, self.region_max)
+        self.in_region = bool(above[-1])
+
+        self.n_seen += n
+
+        # forget peaks that have left the window
+        while self.peaks and self.peaks[0] < self.n_seen - self.window_samples:
+            self.peaks.popleft()
+            self.peak_values.popleft()
+
+        measures = self.measures()
+        measures['time'] = self.n_seen / self.sample_rate
+        measures['hop_ms'] = (time.perf_counter() - start_time) * 1000
+        return measures
+
+    def add_peak(self, index, value):
+        """Adds a peak, unless it is too close to the last one.
+
+        Of two peaks closer than min_interval, the higher one is kept.
+        """
+        if self.peaks and index - self.peaks[-1] < self.min_gap:
+            if value > self.peak_values[-1]:
+                self.peaks[-1] = index
+                self.peak_values[-1] = value
+            return
+        self.peaks.append(index)
+        self.peak_values.append(value)
+
+    def measures(self):
+        """Computes heart rate measures from the peaks in the window.
+
+        returns: dictionary with bpm, ibi, sdnn, sdsd, rmssd, pnn20, pnn50
+        """
+        peaks = np.fromiter(self.peaks, dtype=np.float64, count=len(self.peaks))
+        rr = np.diff(peaks) * 1000 / self.sample_rate
+        rr = rr[rr <= self.max_interval_ms]
+
+        # reject intervals far from the mean, like heartpy's check_peaks
+        if len(rr):
+            mean_rr = rr.mean()
+            rr = rr[np.abs(rr - mean_rr) < max(0.3 * mean_rr, 300)]
+
+        m = dict.fromkeys(['bpm', 'ibi', 'sdnn', 'sdsd', 'rmssd', 'pnn20', 'pnn50'], np.nan)
+        if len(rr) == 0:
+            return m
+        m['ibi'] = rr.mean()
+        m['bpm'] = 60000 / m['ibi']
+        m['sdnn'] = rr.std()
+        if len(rr) > 1:
+            diffs = np.abs(np.diff(rr))
+            m['sdsd'] = diffs.std()
+            m['rmssd'] = np.sqrt(np.mean(diffs ** 2))
+            m['pnn20'] = np.mean(diffs > 20)
+            m['pnn50'] = np.mean(diffs > 50)
+        return m
+
+
+def parse_lines(lines):
+    """Converts lines of text to an array of numbers, skipping bad lines."""
+    values = []
+    for line in lines:
+        try:
+            values.append(float(line.split(',')[-1]))
+        except ValueError:
+            continue
+    return np.array(values)
+
+
+def read_stream(file, chunk_lines=100):
+    """Reads samples, one per line, from a file or pipe.
+
+    yields: arrays of up to chunk_lines samples
+    """
+    lines = []
+    for line in file:
+        lines.append(line)
+        if len(lines) == chunk_lines:
+            yield parse_lines(lines)
+            lines = []
+    if lines:
+        yield parse_lines(lines)
+
+
+def follow(filename, poll=0.1):
+    """Reads samples from a file that is still being written, like tail -f.
+
+    Starts at the beginning of the file and runs until interrupted.
+
+    yields: arrays of samples
+    """
+    with open(filename) as file:
+        partial = ''
+        while True:
+            text = file.read()
+            if not text:
+                time.sleep(poll)
+                continue
+            text = partial + text
+            # keep an unfinished last line for the next read
+            lines = text.split('\n')
+            partial = lines.pop()
+            yield parse_lines(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Real-time heart rate monitor.')
+    parser.add_argument('input', help="file with one sample per line, or - for stdin")
+    parser.add_argument('--follow', action='store_true',
+                        help='keep reading as the file grows')
+    parser.add_argument('--sample-rate', type=float, default=sample_rate)
+    parser.add_argument('--window', type=float, default=10.0, help='seconds')
+    parser.add_argument('--hop', type=float, default=1.0, help='seconds')
+    options = parser.parse_args(args)
+
+    monitor = HeartRateMonitor(options.sample_rate, options.window, options.hop)
+
+    if options.input == '-':
+        source = read_stream(sys.stdin)
+    elif options.follow:
+        source = follow(options.input)
+    else:
+        source = read_stream(open(options.input), chunk_lines=10000)
+
+    try:
+        for m in monitor.run(source):
+            print('%7.1f s  bpm: %6.1f  ibi: %6.1f  sdnn: %6.1f  rmssd: %6.1f  (%.2f ms)'
+                  % (m['time'], m['bpm'], m['ibi'], m['sdnn'], m['rmssd'], m['hop_ms']))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,6 +5,8 @@ Created on Sat Jan  8 21:54:08 2022
 @author: chris.pham
 """
 
+import os
+import sys
 import pgzrun
 import pygame
 import pgzero
@@ -12,6 +14,17 @@ import random
 from pgzero.builtins import Actor
 from random import randint
 
+#load the sprites from the atlas, if build_atlas.py has made one;
+#atlas.py is in the folder above this game's folder (pgzero's loader
+#root; __file__ is pgzero's own after "import pgzrun")
+sys.path.append(os.path.join(pgzero.loaders.root, os.pardir))
+try:
+    import atlas
+except ImportError:
+    pass
+else:
+    atlas.install()
+
 #Declare constants
 FONT_COLOR = (255, 255, 255)
 WIDTH = 800
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Spectral analysis of many channels at once.
+
+Noise_Canceling.py finds the peak frequency of one signal and filters
+it.  analyze() does the same for a whole array of signals: a 2-D array
+of (channels, samples), a 3-D array of (batch, channels, samples), or
+any other shape with time along the last axis.  Every step is one
+vectorized call over all the signals, and the FFTs can use several
+threads through scipy's `workers`.  (power_spectrum and peak_frequency
+in fft_filter.py also work along the last axis, for when only one of
+the results is needed.)
+
+Example:
+
+    result = analyze(recordings, d=1/44100, workers=-1)
+    result.peak_freqs        # shape (batch, channels)
+    result.filtered          # same shape as recordings
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from scipy import fft
+
+from fft_filter import frequency_mask
+
+SpectralResult = namedtuple('SpectralResult', ['freqs', 'power', 'peak_freqs', 'filtered'])
+
+
+def analyze(x, d=1.0, mode='lowpass', cutoff=None, pad=True, workers=None):
+    """Computes the power spectrum, peak frequency and filtered signal of every channel.
+
+    x: array of real signals, time along the last axis
+    d: time between samples
+    mode: 'lowpass', 'highpass', 'bandpass' or 'notch'
+    cutoff: one cutoff for all signals, or an array with one per signal
+            (for 'bandpass' and 'notch', (low, high) pairs);
+            by default each signal is filtered at its own peak
+            frequency, like Noise_Canceling.py
+    pad: whether to zero-pad to a fast FFT length, which also
+         changes the frequency grid
+    workers: number of threads for the FFTs; -1 means all CPUs
+
+    returns: SpectralResult with
+             freqs: the frequency of each bin, shape (n_freqs,)
+             power: shape x.shape[:-1] + (n_freqs,)
+             peak_freqs: positive frequency with the most power, shape x.shape[:-1]
+             filtered: same shape as x
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    n_fft = fft.next_fast_len(n, real=True) if pad else n
+
+    spectrum = fft.rfft(x, n=n_fft, axis=-1, workers=workers)
+    freqs = fft.rfftfreq(n_fft, d=d)
+    power = np.abs(spectrum)**2
+
+    # skip the zero frequency
+    peak_freqs = freqs[1:][power[..., 1:].argmax(axis=-1)]
+
+    if cutoff is None:
+        if mode not in ('lowpass', 'highpass'):
+            raise ValueError('%s needs a (low, high) cutoff' % mode)
+        cutoff = peak_freqs
+
+    spectrum *= frequency_mask(freqs, mode, cutoff)
+    filtered = fft.irfft(spectrum, n=n_fft, axis=-1, overwrite_x=True, workers=workers)
+    return SpectralResult(freqs, power, peak_freqs, filtered[..., :n])
+
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming version of the filter in Noise_Canceling.py.
+
+Noise_Canceling.py transforms the whole signal at once, which needs the
+whole signal in memory.  OverlapAddDenoiser cuts the signal into
+overlapping windowed frames instead (a short-time Fourier transform),
+applies the same frequency mask to each frame, and adds the frames back
+together.  Memory use depends on the frame size, not the length of the
+signal, and samples come out as soon as the frames covering them are
+done, so it can run on a live feed.
+
+The frames use a square-root Hann window for both analysis and
+synthesis, which adds back up to exactly the input when nothing is
+masked.  Output is aligned with the input and has the same length.
+
+Each frame sees a tone as a peak a few bins wide, so a cutoff right at
+a tone's frequency, which is what Noise_Canceling.py uses, cuts part of
+that tone.  With the cutoff a few bins away from any tone, the result
+matches the full-signal filter closely, and more so for longer frames.
+
+Run this file to compare it with the full-signal FFT filter:
+
+    python stream_denoise.py                 # one hour at 1 kHz
+    python stream_denoise.py ../wavfile/h1.wav
+"""
+
+import sys
+import time
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft
+
+from fft_filter import FFTFilter, peak_frequency
+
+
+class OverlapAddDenoiser:
+    """Applies an FFTFilter frame by frame, with overlap-add."""
+
+    def __init__(self, filt, frame_size=4096, hop=None):
+        """
+        filt: FFTFilter that provides the frequency mask
+        frame_size: samples per frame
+        hop: samples between frames; must divide frame_size and be at
+             most half of it; default is half a frame
+        """
+        if hop is None:
+            hop = frame_size // 2
+        if frame_size % hop or frame_size // hop < 2:
+            raise ValueError('hop should divide frame_size, at most half of it')
+
+        self.frame_size = frame_size
+        self.hop = hop
+        self.mask = filt.mask(frame_size)
+
+        # periodic sqrt-Hann; scaled so the overlapping frames add up to 1
+        window = np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_size) / frame_size))
+        self.window = window
+        self.synthesis = window * hop / np.sum(window**2)
+
+        # start with a frame's worth of zeros, so the first samples
+        # are covered by as many frames as the rest
+        self.inbuf = np.zeros(frame_size - hop)
+        self.overlap = np.zeros(frame_size - hop)
+        self.skip = frame_size - hop
+        self.n_in = 0
+        self.n_out = 0
+
+    def process(self, block):
+        """Filters the next block of samples.
+
+        block: 1-D array of any length
+
+        returns: array of filtered samples, which can be shorter or
+                 longer than block, because of the frame delay
+        """
+        block = np.asarray(block, dtype=np.float64)
+        self.n_in += len(block)
+
+        buf = np.concatenate((self.inbuf, block))
+        N, hop = self.frame_size, self.hop
+        if len(buf) < N:
+            self.inbuf = buf
+            return np.zeros(0)
+        n_frames = (len(buf) - N) // hop + 1
+
+        # all the complete frames in this block at once
+        frames = sliding_window_view(buf, N)[::hop][:n_frames] * self.window
+        spectrum = fft.rfft(frames, axis=-1, overwrite_x=True)
+        spectrum *= self.mask
+        frames = fft.irfft(spectrum, n=N, axis=-1, overwrite_x=True)
+        frames *= self.synthesis
+
+        # overlap-add, one hop-sized piece of every frame at a time
+        out = np.zeros(n_frames * hop + N - hop)
+        out[:N - hop] = self.overlap
+        for j in range(N // hop):
+            piece = out[j * hop:j * hop + n_frames * hop].reshape(n_frames, hop)
+            piece += frames[:, j * hop:(j + 1) * hop]
+
+        self.inbuf = buf[n_frames * hop:]
+        self.overlap = out[n_frames * hop:]
+        ready = out[:n_frames * hop]
+
+        # drop the delay introduced by the leading zeros
+        if self.skip:
+            dropped = min(self.skip, len(ready))
+            ready = ready[dropped:]
+            self.skip -= dropped
+
+        self.n_out += len(ready)
+        return ready
+
+    def flush(self):
+        """Returns the filtered samples still waiting for later frames."""
+        remaining = self.n_in - self.n_out
+        n_in = self.n_in
+        tail = self.process(np.zeros(self.frame_size + self.hop))
+        self.n_in = n_in
+        self.n_out -= len(tail) - remaining
+        return tail[:remaining]
+
+    def run(self, blocks):
+        """Filters an iterable of blocks.
+
+        yields: arrays of filtered samples
+        """
+        for block in blocks:
+            out = self.process(block)
+            if len(out):
+                yield out
+        yield self.flush()
+
+
+def iter_blocks(source, block_size=65536):
+    """Splits an array into blocks, or passes an iterable of blocks through.
+
+    yields: 1-D arrays
+    """
+    if isinstance(source, np.ndarray):
+        for start in range(0, len(source), block_size):
+            yield source[start:start + block_size]
+    else:
+        for block in source:
+            yield np.atleast_1d(block)
+
+
+def wav_blocks(filename, block_size=65536):
+    """Reads the first channel of a 8 or 16 bit .wav file in blocks.
+
+    returns: sample rate, generator of 1-D float arrays
+    """
+    spf = wave.open(filename, 'rb')
+    sample_rate = spf.getframerate()
+    n_channels = spf.getnchannels()
+    dtype = {1: np.uint8, 2: np.int16}.get(spf.getsampwidth())
+    if dtype is None:
+        raise ValueError("Only supports 8 and 16 bit audio formats.")
+
+    def blocks():
+        with spf:
+            while True:
+                raw = spf.readframes(block_size)
+                if not raw:
+                    break
+                samples = np.frombuffer(raw, dtype=dtype).reshape(-1, n_channels)
+                yield samples[:, 0].astype(np.float64)
+
+    return sample_rate, blocks()
+
+
+def denoise(source, d, cutoff=None, frame_size=4096, block_size=65536):
+    """Low-pass filters a long signal at its peak frequency, block by block.
+
+    Like Noise_Canceling.py, the cutoff defaults to the peak frequency,
+    which is estimated from the first block.
+
+    source: array, iterable of blocks, or .wav file name
+    d: time between samples; ignored for .wav files
+    cutoff: cutoff frequency, or None to use the peak frequency
+
+    yields: arrays of filtered samples
+    """
+    if isinstance(source, str):
+        sample_rate, blocks = wav_blocks(source, block_size)
+        d = 1 / sample_rate
+    else:
+        blocks = iter_blocks(source, block_size)
+
+    first = next(blocks, None)
+    if first is None:
+        return
+    if cutoff is None:
+        cutoff = peak_frequency(first, d)
+
+    denoiser = OverlapAddDenoiser(FFTFilter('lowpass', cutoff, d=d, pad=False), frame_size)
+    yield denoiser.process(first)
+    for out in denoiser.run(blocks):
+        yield out
+
+
+def benchmark(sig=None, d=1e-3, frame_size=4096, cutoff=None):
+    """Compares the streaming denoiser with the full-signal FFT filter.
+
+    sig: signal, default is an hour of the Noise_Canceling.py signal at 1 kHz
+    d: time between samples
+    frame_size: samples per frame for the streaming denoiser
+    cutoff: cutoff frequency, default is the peak frequency
+
+    returns: dictionary of results
+    """
+    if sig is None:
+        time_vec = np.arange(0, 3600, d)
+        sig = (np.sin(2 * np.pi * 1 * time_vec) +
+               0.8 * np.sin(2 * np.pi * 10 * time_vec) +
+               0.5 * np.sin(2 * np.pi * 20 * time_vec))
+    sig = np.asarray(sig, dtype=np.float64)
+    if cutoff is None:
+        cutoff = peak_frequency(sig[:65536], d)
+
+    start = time.perf_counter()
+    full = FFTFilter('lowpass', cutoff, d=d)(sig)
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    streamed = np.concatenate(list(denoise(sig, d, cutoff, frame_size)))
+    stream_time = time.perf_counter() - start
+
+    # the ends of the full-signal result wrap around, so compare the middle
+    middle = slice(frame_size, len(sig) - frame_size)
+    error = streamed[middle] - full[middle]
+    results = dict(
+        samples=len(sig),
+        cutoff=cutoff,
+        full_seconds=full_time,
+        stream_seconds=stream_time,
+        full_rate=len(sig) / full_time,
+        stream_rate=len(sig) / stream_time,
+        rms_error=np.sqrt(np.mean(error**2)),
+        rms_signal=np.sqrt(np.mean(full[middle]**2)),
+    )
+
+    print('samples:        %d (cutoff %g Hz)' % (results['samples'], cutoff))
+    print('full FFT:       %.3f s, %.3g samples/s' % (full_time, results['full_rate']))
+    print('overlap-add:    %.3f s, %.3g samples/s' % (stream_time, results['stream_rate']))
+    print('RMS difference: %.3g (signal RMS %.3g)' % (results['rms_error'], results['rms_signal']))
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sample_rate, blocks = wav_blocks(sys.argv[1])
+        benchmark(np.concatenate(list(blocks)), 1 / sample_rate)
+    else:
+        print('Cutoff at the peak frequency, as in Noise_Canceling.py:')
+        benchmark()
+        print()
+        print('Cutoff between the 1 Hz signal and the 10 Hz noise:')
+        benchmark(cutoff=3.0)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Local cache of CIFAR-10 as memory-mapped .npy files.
+
+datasets.cifar10.load_data() unpickles the whole dataset every time,
+and cnn.py then made float64 copies of the images (8 bytes per pixel)
+and one-hot copies of the labels.  Here the dataset is converted once
+into four .npy files:
+
+    train_images.npy   uint8, (50000, 32, 32, 3)
+    train_labels.npy   uint8, (50000,)
+    test_images.npy    uint8, (10000, 32, 32, 3)
+    test_labels.npy    uint8, (10000,)
+
+and load_cifar() memory-maps them, so loading is instant and pages are
+read only when they are used.  Images stay uint8 (1 byte per pixel);
+input_pipeline.py reads them from the map a batch at a time, without
+copying the whole array, and scales each batch to float32.  Labels are
+class numbers, for sparse_categorical_crossentropy.
+
+The cache is in ~/.keras/datasets/cifar10_npy, or the directory in the
+CIFAR10_CACHE environment variable.  To build it ahead of time (it needs
+the Keras download, or its copy in ~/.keras/datasets, once):
+
+    python cifar_cache.py
+"""
+
+import os
+import sys
+
+import numpy as np
+
+CACHE_DIR = os.environ.get('CIFAR10_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.keras', 'datasets',
+                                        'cifar10_npy'))
+
+NAMES = ('train_images', 'train_labels', 'test_images', 'test_labels')
+
+
+def cache_files(cache_dir=None):
+    """Returns the paths of the cached arrays, in the order of NAMES."""
+    cache_dir = cache_dir or CACHE_DIR
+    return [os.path.join(cache_dir, name + '.npy') for name in NAMES]
+
+
+def build_cache(cache_dir=None):
+    """Converts CIFAR-10 to .npy files, downloading it if Keras hasn't already.
+
+    returns: list of file names
+    """
+    from tensorflow.keras import datasets
+
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    (train_images, train_labels), (test_images, test_labels) = datasets.cifar10.load_data()
+    arrays = [train_images, train_labels.reshape(-1), test_images, test_labels.reshape(-1)]
+
+    filenames = cache_files(cache_dir)
+    for filename, array in zip(filenames, arrays):
+        # write under another name first, so a crash can't leave half a file
+        tmp = filename + '.tmp.npy'
+        np.save(tmp, np.ascontiguousarray(array, dtype=np.uint8))
+        os.replace(tmp, filename)
+    return filenames
+
+
+def load_cifar(cache_dir=None):
+    """Memory-maps the cached dataset, building the cache the first time.
+
+    returns: (train_images, train_labels), (test_images, test_labels)
+             as read-only uint8 arrays; labels are class numbers
+    """
+    filenames = cache_files(cache_dir)
+    if not all(os.path.exists(filename) for filename in filenames):
+        build_cache(cache_dir)
+    train_images, train_labels, test_images, test_labels = [
+        np.load(filename, mmap_mode='r') for filename in filenames]
+    return (train_images, train_labels), (test_images, test_labels)
+
+
+if __name__ == '__main__':
+    for filename in build_cache(sys.argv[1] if len(sys.argv) > 1 else None):
+        print('%s  %.1f MB' % (filename, os.path.getsize(filename) / 1e6))
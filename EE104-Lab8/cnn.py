@@ -51,26 +51,26 @@ This tutorial demonstrates training a simple [Convolutional Neural Network](http
 
 import tensorflow as tf
 
-from tensorflow.keras import datasets, layers, models
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.utils import to_categorical
+from tensorflow.keras import layers, models
 import numpy as np
 import matplotlib.pyplot as plt
 
+from cifar_cache import load_cifar
+from input_pipeline import train_dataset, test_dataset
+from predict import predict_files
+from train import make_callbacks
+
 """### Download and prepare the CIFAR10 dataset
 
 
 The CIFAR10 dataset contains 60,000 color images in 10 classes, with 6,000 images in each class. The dataset is divided into 50,000 training images and 10,000 testing images. The classes are mutually exclusive and there is no overlap between them.
 """
 
-(train_images, train_labels), (test_images, test_labels) = datasets.cifar10.load_data()
-
-# Normalize pixel values to be between 0 and 1
-train_images, test_images = train_images / 255.0, test_images / 255.0
+# Downloaded once, then memory-mapped from a local cache as uint8 (see cifar_cache.py)
+(train_images, train_labels), (test_images, test_labels) = load_cifar()
 
-# One hot encoding
-train_labels_cat = to_categorical(train_labels,10)
-test_labels_cat = to_categorical(test_labels,10)
+# Pixel values are scaled to be between 0 and 1 a batch at a time, in the
+# input pipeline; the labels stay class numbers (sparse), not one-hot
 
 """### Verify the data
 
@@ -88,9 +88,7 @@ for i in range(25):
     plt.yticks([])
     plt.grid(False)
     plt.imshow(train_images[i])
-    # The CIFAR labels happen to be arrays, 
-    # which is why you need the extra index
-    plt.xlabel(class_names[train_labels[i][0]])
+    plt.xlabel(class_names[train_labels[i]])
 plt.show()
 
 """### Create the convolutional base
@@ -146,13 +144,13 @@ model.summary()
 ### Compile and train the model
 """
 
-model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
 
-#data augmentation
-datagen = ImageDataGenerator(width_shift_range=0.1, height_shift_range=0.1, horizontal_flip=True,rotation_range=20)
-it_train = datagen.flow(train_images,train_labels_cat)
-steps = int(train_images.shape[0] / 64)
-history=model.fit_generator(it_train,epochs=200,steps_per_epoch=steps,validation_data=(test_images,test_labels_cat))
+#data augmentation, done by the tf.data pipeline in input_pipeline.py
+train_ds = train_dataset(train_images, train_labels, batch_size=64)
+test_ds = test_dataset(test_images, test_labels)
+# checkpoints every epoch, resumes after a crash, stops early once val_accuracy stops improving
+history=model.fit(train_ds,epochs=200,validation_data=test_ds,callbacks=make_callbacks('checkpoints'))
 
 """### Evaluate the model"""
 
@@ -163,7 +161,7 @@ plt.ylabel('Accuracy')
 plt.ylim([0.5, 1])
 plt.legend(loc='lower right')
 
-test_loss, test_acc = model.evaluate(test_images,  test_labels_cat, verbose=2)
+test_loss, test_acc = model.evaluate(test_ds, verbose=2)
 
 print(test_acc*100.0)
 
@@ -175,7 +173,7 @@ val_acc = history.history['val_accuracy']
 loss = history.history['loss']
 val_loss = history.history['val_loss']
 
-epochs_range = range(200)
+epochs_range = range(len(acc))
 
 plt.figure(figsize=(8, 8))
 plt.subplot(1, 2, 1)
@@ -191,91 +189,31 @@ plt.legend(loc='upper right')
 plt.title('Training and Validation Loss')
 plt.show()
 
+"""### Save the model
+
+predict.py loads the saved model to classify a directory of images in large batches:
+
+    python predict.py cnn_cifar10.keras photos/
+"""
+
+model.save('cnn_cifar10.keras')
+
 """### Predict on new data"""
 
-airplane_url = "https://www.zdnet.com/a/img/resize/071727877ee9884b60edd728253d2baadcb3985f/2021/02/23/19631992-64df-4af9-a288-a0cb4112e682/bombardier-globaleye-jet.jpg?width=1200&height=900&fit=crop&auto=webp"
-airplane_path = tf.keras.utils.get_file('airplane', origin=airplane_url)
-
-img = tf.keras.utils.load_img(
-    airplane_path, target_size=(32, 32)
-)
-img_array = tf.keras.utils.img_to_array(img)
-img_array = tf.expand_dims(img_array, 0) # Create a batch
-
-predictions = model.predict(img_array)
-score = tf.nn.softmax(predictions[0])
-
-print(
-    "This image most likely belongs to {} with a {:.2f} percent confidence."
-    .format(class_names[np.argmax(score)], 100 * np.max(score))
-)
-
-automobile_url = "https://hips.hearstapps.com/hmg-prod.s3.amazonaws.com/images/devel-motors-sixteen-1540564064.jpg"
-automobile_path = tf.keras.utils.get_file('automobile', origin=automobile_url)
-
-img = tf.keras.utils.load_img(
-    automobile_path, target_size=(32, 32)
-)
-img_array = tf.keras.utils.img_to_array(img)
-img_array = tf.expand_dims(img_array, 0) # Create a batch
-
-predictions = model.predict(img_array)
-score = tf.nn.softmax(predictions[0])
-
-print(
-    "This image most likely belongs to {} with a {:.2f} percent confidence."
-    .format(class_names[np.argmax(score)], 100 * np.max(score))
-)
-
-bird_url = "https://ichef.bbci.co.uk/news/976/cpsprodpb/67CF/production/_108857562_mediaitem108857561.jpg"
-bird_path = tf.keras.utils.get_file('bird', origin=bird_url)
-
-img = tf.keras.utils.load_img(
-    bird_path, target_size=(32, 32)
-)
-img_array = tf.keras.utils.img_to_array(img)
-img_array = tf.expand_dims(img_array, 0) # Create a batch
-
-predictions = model.predict(img_array)
-score = tf.nn.softmax(predictions[0])
-
-print(
-    "This image most likely belongs to {} with a {:.2f} percent confidence."
-    .format(class_names[np.argmax(score)], 100 * np.max(score))
-)
-
-bird_url = "https://upload.wikimedia.org/wikipedia/commons/5/53/Weaver_bird.jpg"
-bird_path = tf.keras.utils.get_file('bird', origin=bird_url)
-
-img = tf.keras.utils.load_img(
-    bird_path, target_size=(32, 32)
-)
-img_array = tf.keras.utils.img_to_array(img)
-img_array = tf.expand_dims(img_array, 0) # Create a batch
-
-predictions = model.predict(img_array)
-score = tf.nn.softmax(predictions[0])
-
-print(
-    "This image most likely belongs to {} with a {:.2f} percent confidence."
-    .format(class_names[np.argmax(score)], 100 * np.max(score))
-)
-
-automobile_url = "https://amsc-prod-cd.azureedge.net/-/media/aston-martin/images/default-source/models/valkyrie/new/valkyrie-spider_f02-169v2.jpg?mw=1980&rev=-1&hash=92E23C911BDE23D418D37F9187844B7C"
-automobile_path = tf.keras.utils.get_file('automobile', origin=automobile_url)
-
-img = tf.keras.utils.load_img(
-    automobile_path, target_size=(32, 32)
-)
-img_array = tf.keras.utils.img_to_array(img)
-img_array = tf.expand_dims(img_array, 0) # Create a batch
-
-predictions = model.predict(img_array)
-score = tf.nn.softmax(predictions[0])
-
-print(
-    "This image most likely belongs to {} with a {:.2f} percent confidence."
-    .format(class_names[np.argmax(score)], 100 * np.max(score))
-)
+image_urls = {
+    'airplane': "https://www.zdnet.com/a/img/resize/071727877ee9884b60edd728253d2baadcb3985f/2021/02/23/19631992-64df-4af9-a288-a0cb4112e682/bombardier-globaleye-jet.jpg?width=1200&height=900&fit=crop&auto=webp",
+    'automobile': "https://hips.hearstapps.com/hmg-prod.s3.amazonaws.com/images/devel-motors-sixteen-1540564064.jpg",
+    'bird': "https://ichef.bbci.co.uk/news/976/cpsprodpb/67CF/production/_108857562_mediaitem108857561.jpg",
+    'weaver_bird': "https://upload.wikimedia.org/wikipedia/commons/5/53/Weaver_bird.jpg",
+    'valkyrie': "https://amsc-prod-cd.azureedge.net/-/media/aston-martin/images/default-source/models/valkyrie/new/valkyrie-spider_f02-169v2.jpg?mw=1980&rev=-1&hash=92E23C911BDE23D418D37F9187844B7C",
+}
+image_paths = [tf.keras.utils.get_file(name, origin=url) for name, url in image_urls.items()]
+
+# all the images in one batch; the model's outputs are already softmax probabilities
+for path, label, confidence in predict_files(model, image_paths):
+    print(
+        "This image most likely belongs to {} with a {:.2f} percent confidence."
+        .format(label, 100 * confidence)
+    )
 
 """Your simple CNN has achieved a test accuracy of over 70%. Not bad for a few lines of code! For another CNN style, check out the [TensorFlow 2 quickstart for experts](https://www.tensorflow.org/tutorials/quickstart/advanced) example that uses the Keras subclassing API and `tf.GradientTape`."""
\ No newline at end of file
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""The CIFAR-10 network from cnn.py, as a function.
+
+cnn.py builds the network one layer at a time to explain it; the
+training scripts use build_model() to get the same network.
+
+Under a mixed precision policy the layers compute in bfloat16 or
+float16, but the final softmax is kept in float32 so the probabilities
+and the loss are computed at full precision.
+"""
+
+from tensorflow.keras import layers, models
+
+class_names = ['airplane', 'automobile', 'bird', 'cat', 'deer',
+               'dog', 'frog', 'horse', 'ship', 'truck']
+
+
+def conv_block(model, filters, dropout):
+    """Adds two 3x3 convolutions with batch normalization, then pooling and dropout."""
+    for _ in range(2):
+        model.add(layers.Conv2D(filters, (3, 3), activation='relu',
+                                kernel_initializer='he_uniform', padding='same'))
+        model.add(layers.BatchNormalization())
+    model.add(layers.MaxPooling2D((2, 2)))
+    model.add(layers.Dropout(dropout))
+
+
+def build_model(input_shape=(32, 32, 3), n_classes=10):
+    """Builds the (uncompiled) network from cnn.py.
+
+    Uses the global Keras dtype policy for every layer except the output.
+
+    returns: Sequential model
+    """
+    model = models.Sequential(name='cnn')
+    model.add(layers.Input(input_shape))
+    conv_block(model, 32, 0.2)
+    conv_block(model, 64, 0.3)
+    conv_block(model, 128, 0.4)
+    model.add(layers.Flatten())
+    model.add(layers.Dense(128, activation='relu', kernel_initializer='he_uniform'))
+    model.add(layers.BatchNormalization())
+    model.add(layers.Dropout(0.5))
+    # float32 output, even under mixed precision
+    model.add(layers.Dense(n_classes, activation='softmax', dtype='float32'))
+    return model
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""Data-parallel training of the CIFAR-10 network over several processes.
+
+Each worker process holds a copy of the model and trains on its own
+shard of the training set; after every step the gradients are summed
+across the workers (tf.distribute.MultiWorkerMirroredStrategy), so all
+copies stay the same.  The batch size is per worker, and the learning
+rate is scaled with the global batch size, as in train.py.
+
+On one machine, --workers N starts N local processes with a TF_CONFIG
+that describes a cluster of localhost ports.  Each process gets an
+equal share of the CPU threads, and with --numa worker i is bound to
+NUMA node i with numactl.  On several machines, start this file with
+--worker on each one, with TF_CONFIG set to the real cluster.
+
+Usage:
+
+    python distributed.py --workers 4 --epochs 200
+    python distributed.py --benchmark --epochs 3          # 1, 2 and 4 workers
+    TF_CONFIG='{...}' python distributed.py --worker      # one worker of a cluster
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def free_ports(n):
+    """Finds n free TCP ports on localhost."""
+    sockets = []
+    for _ in range(n):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('localhost', 0))
+        sockets.append(sock)
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def local_cluster(n_workers):
+    """Makes the cluster part of TF_CONFIG for n workers on this machine."""
+    return {'worker': ['localhost:%d' % port for port in free_ports(n_workers)]}
+
+
+def numa_nodes():
+    """Returns the number of NUMA nodes, or 1 if it can't be found."""
+    try:
+        names = os.listdir('/sys/devices/system/node')
+    except OSError:
+        return 1
+    return len([name for name in names if name.startswith('node') and name[4:].isdigit()]) or 1
+
+
+def launch(n_workers, worker_args, threads=None, numa=False):
+    """Runs n workers of this script as local processes and waits for them.
+
+    worker_args: command line arguments for every worker
+    threads: CPU threads per worker, default is an equal share
+    numa: whether to bind each worker to a NUMA node with numactl
+
+    returns: list of exit codes
+    """
+    cluster = local_cluster(n_workers)
+    if threads is None:
+        threads = max(os.cpu_count() // n_workers, 1)
+    nodes = numa_nodes()
+
+    processes = []
+    for index in range(n_workers):
+        env = dict(os.environ)
+        env['TF_CONFIG'] = json.dumps({'cluster': cluster,
+                                       'task': {'type': 'worker', 'index': index}})
+        command = [sys.executable, os.path.abspath(__file__), '--worker',
+                   '--threads', str(threads)] + list(worker_args)
+        if numa and shutil.which('numactl'):
+            node = str(index % nodes)
+            command = ['numactl', '--cpunodebind=' + node, '--membind=' + node] + command
+        processes.append(subprocess.Popen(command, env=env))
+
+    while True:
+        codes = [process.poll() for process in processes]
+        if all(code is not None for code in codes):
+            return codes
+        # one failed worker leaves the others waiting for it forever
+        if any(codes):
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+            return [process.wait() for process in processes]
+        time.sleep(0.5)
+
+
+def make_steps(strategy, model, global_batch_size):
+    """Makes the distributed training and evaluation steps.
+
+    Each step runs on every worker's batch; the optimizer sums the
+    gradients across workers, so the loss on each worker is divided by
+    the global batch size.
+
+    returns: train_step, test_step; each takes a distributed batch and
+             returns (sum of losses, number correct, number of images)
+    """
+    import tensorflow as tf
+
+    def replica_step(images, labels, training):
+        labels = tf.cast(tf.reshape(labels, [-1]), tf.int32)
+        with tf.GradientTape() as tape:
+            probs = model(images, training=training)
+            losses = tf.keras.losses.sparse_categorical_crossentropy(labels, probs)
+            loss = tf.nn.compute_average_loss(losses, global_batch_size=global_batch_size)
+        if training:
+            grads = tape.gradient(loss, model.trainable_variables)
+            model.optimizer.apply_gradients(zip(grads, model.trainable_variables))
+        predicted = tf.argmax(probs, axis=1, output_type=labels.dtype)
+        correct = tf.reduce_sum(tf.cast(predicted == labels, tf.float32))
+        count = tf.cast(tf.size(labels), tf.float32)
+        return tf.reduce_sum(losses), correct, count
+
+    def run(batch, training):
+        images, labels = batch
+        per_replica = strategy.run(replica_step, args=(images, labels, training))
+        return [strategy.reduce('SUM', value, axis=None) for value in per_replica]
+
+    train_step = tf.function(lambda batch: run(batch, True))
+    test_step = tf.function(lambda batch: run(batch, False))
+    return train_step, test_step
+
+
+def run_epoch(step, dataset):
+    """Runs a step on every batch of a distributed dataset.
+
+    returns: mean loss, accuracy
+    """
+    total_loss = correct = count = 0
+    for batch in dataset:
+        batch_loss, batch_correct, batch_count = step(batch)
+        total_loss += float(batch_loss)
+        correct += float(batch_correct)
+        count += float(batch_count)
+    return total_loss / count, correct / count
+
+
+def run_worker(epochs, batch_size, threads=None, limit=None, save=None, result=None):
+    """Trains as one worker of the cluster in TF_CONFIG.
+
+    batch_size: images per step on this worker
+    threads: CPU threads for this worker
+    limit: optional number of training images to use, for benchmarks
+    save: where the first worker (the chief) saves the model
+    result: file where the chief writes the epoch times and accuracy as JSON
+    """
+    import tensorflow as tf
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(2)
+
+    from cifar_cache import load_cifar
+    from input_pipeline import train_dataset, test_dataset
+    from train import compile_model
+
+    strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    task = json.loads(os.environ['TF_CONFIG'])['task']
+    n_workers = strategy.num_replicas_in_sync
+    is_chief = task['index'] == 0
+
+    (train_images, train_labels), (test_images, test_labels) = load_cifar()
+    if limit:
+        train_images, train_labels = train_images[:limit], train_labels[:limit]
+
+    # each worker gets every n-th image; the batches are global, and
+    # tf.distribute splits each one between the workers
+    global_batch_size = batch_size * n_workers
+    train_ds = train_dataset(train_images, train_labels, global_batch_size,
+                             shard=(n_workers, task['index']))
+    test_ds = test_dataset(test_images, test_labels, batch_size=256 * n_workers)
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+    test_ds = test_ds.with_options(options)
+
+    # a loop of our own rather than model.fit, which in Keras 3 fails
+    # with more than one worker
+    with strategy.scope():
+        model = compile_model(batch_size=global_batch_size)
+    train_step, test_step = make_steps(strategy, model, global_batch_size)
+    train_dist = strategy.experimental_distribute_dataset(train_ds)
+    test_dist = strategy.experimental_distribute_dataset(test_ds)
+
+    epoch_times, val_accuracy = [], []
+    for epoch in range(epochs):
+        # only training is timed, so the benchmark isn't diluted by evaluation
+        start = time.perf_counter()
+        loss, acc = run_epoch(train_step, train_dist)
+        epoch_times.append(time.perf_counter() - start)
+        val_loss, val_acc = run_epoch(test_step, test_dist)
+        val_accuracy.append(val_acc)
+        if is_chief:
+            print('epoch %d/%d - %.1fs - loss: %.4f - accuracy: %.4f - val_loss: %.4f - '
+                  'val_accuracy: %.4f' % (epoch + 1, epochs, epoch_times[-1], loss, acc,
+                                          val_loss, val_acc), flush=True)
+
+    # every worker has to take part in saving; only the chief's copy is kept
+    if save:
+        path = save if is_chief else os.path.join(tempfile.mkdtemp(), os.path.basename(save))
+        model.save(path)
+        if not is_chief:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+    if is_chief and result:
+        with open(result, 'w') as file:
+            json.dump(dict(workers=n_workers, global_batch_size=global_batch_size,
+                           epoch_times=epoch_times, val_accuracy=val_accuracy), file)
+
+
+def benchmark(worker_counts=(1, 2, 4), epochs=3, batch_size=64, limit=None, numa=False):
+    """Trains with different numbers of workers and reports the scaling.
+
+    The batch per worker stays the same, so each epoch takes fewer steps
+    with more workers.  Only the training part of each epoch is timed.
+    Scaling efficiency is the speedup divided by the
+    number of workers.
+
+    returns: dictionary from number of workers to results
+    """
+    results = {}
+    for n in worker_counts:
+        print('training with %d worker%s' % (n, '' if n == 1 else 's'))
+        fd, result_file = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        worker_args = ['--epochs', str(epochs), '--batch-size', str(batch_size),
+                       '--result', result_file]
+        if limit:
+            worker_args += ['--limit', str(limit)]
+        codes = launch(n, worker_args, numa=numa)
+        if any(codes):
+            print('  failed, exit codes %s' % codes)
+            continue
+        with open(result_file) as file:
+            results[n] = json.load(file)
+        os.remove(result_file)
+
+    print('%8s %8s %10s %10s %8s %11s %9s' % ('workers', 'batch', 's/epoch', 'images/s',
+                                              'speedup', 'efficiency', 'accuracy'))
+    base = None
+    for n, r in results.items():
+        times = r['epoch_times']
+        # the first epoch includes setup and tracing
+        r['epoch_time'] = np.median(times[1:]) if len(times) > 1 else times[0]
+        r['images_per_second'] = (limit or 50000) / r['epoch_time']
+        if base is None:
+            base = r['epoch_time'] * n
+        speedup = base / r['epoch_time']
+        print('%8d %8d %10.1f %10.0f %7.2fx %10.0f%% %8.2f%%'
+              % (n, r['global_batch_size'], r['epoch_time'], r['images_per_second'],
+                 speedup, 100 * speedup / n, 100 * r['val_accuracy'][-1]))
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Data-parallel training of the CIFAR-10 CNN.')
+    parser.add_argument('--workers', type=int, default=2, help='local worker processes')
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=64, help='images per step per worker')
+    parser.add_argument('--threads', type=int, help='CPU threads per worker')
+    parser.add_argument('--numa', action='store_true', help='bind workers to NUMA nodes')
+    parser.add_argument('--limit', type=int, help='use only this many training images')
+    parser.add_argument('--save', default='cnn_cifar10.keras', help='where to save the model')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='compare 1, 2 and 4 workers for --epochs epochs each')
+    parser.add_argument('--worker', action='store_true',
+                        help='run as one worker of the cluster in TF_CONFIG')
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    options = parser.parse_args(args)
+
+    if options.worker:
+        run_worker(options.epochs, options.batch_size, options.threads, options.limit,
+                   None if options.result else options.save, options.result)
+        return 0
+
+    if options.benchmark:
+        benchmark(epochs=options.epochs, batch_size=options.batch_size,
+                  limit=options.limit, numa=options.numa)
+        return 0
+
+    worker_args = ['--epochs', str(options.epochs), '--batch-size', str(options.batch_size),
+                   '--save', options.save]
+    if options.limit:
+        worker_args += ['--limit', str(options.limit)]
+    start = time.perf_counter()
+    codes = launch(options.workers, worker_args, options.threads, options.numa)
+    print('%d workers finished in %.0f s, exit codes %s'
+          % (options.workers, time.perf_counter() - start, codes))
+    return 1 if any(codes) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
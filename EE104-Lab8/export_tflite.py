@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""Exports the CIFAR-10 classifier trained by cnn.py to TensorFlow Lite.
+
+Writes three models:
+
+    cnn_float32.tflite   the model as it is
+    cnn_float16.tflite   weights stored as float16
+    cnn_int8.tflite      weights and activations quantized to int8,
+                         calibrated on images from the CIFAR training set
+
+and reports the size, the latency for one image on the CPU, and the
+test accuracy of each, next to the Keras model.
+
+Before converting, BatchNormalization layers are folded into
+neighbouring layers where that gives exactly the same results.  In
+cnn.py every BatchNormalization comes after a ReLU, so it can't be
+folded back into the layer before it; instead it is folded forward into
+the next Dense layer, or the next Conv2D with 'valid' padding, through
+any Dropout, Flatten or (when every scale is positive) MaxPooling2D
+layers in between.  A 'same' Conv2D pads the normalized values with
+zeros, which can't be expressed by changing its weights, so the
+BatchNormalization layers in front of those are kept; the converter
+turns them into a multiply and an add.
+
+Usage:
+
+    python export_tflite.py cnn_cifar10.keras
+    python export_tflite.py cnn_cifar10.keras --output-dir tflite --threads 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers, models
+
+from cifar_cache import load_cifar
+
+# layers that can sit between a BatchNormalization and the layer it is folded into
+PASS_THROUGH = (layers.Dropout, layers.Flatten)
+
+
+def scale_and_shift(bn):
+    """Returns the per-channel scale and shift of an inference-mode BatchNormalization."""
+    params = dict(zip([w.name.split('/')[-1] for w in bn.weights], bn.get_weights()))
+    mean = params['moving_mean']
+    var = params['moving_variance']
+    gamma = params.get('gamma', np.ones_like(mean))
+    beta = params.get('beta', np.zeros_like(mean))
+    scale = gamma / np.sqrt(var + bn.epsilon)
+    return scale, beta - mean * scale
+
+
+def fold_target(model_layers, i, scale):
+    """Finds the layer that the BatchNormalization at index i can be folded into.
+
+    returns: index of the layer, or None
+    """
+    j = i + 1
+    while j < len(model_layers):
+        layer = model_layers[j]
+        if isinstance(layer, PASS_THROUGH):
+            j += 1
+        elif isinstance(layer, layers.MaxPooling2D) and np.all(scale > 0):
+            # max(s*x + t) = s*max(x) + t when s > 0
+            j += 1
+        elif isinstance(layer, layers.Dense):
+            return j
+        elif isinstance(layer, layers.Conv2D) and layer.padding == 'valid':
+            return j
+        else:
+            return None
+    return None
+
+
+def fold_into(layer, weights, scale, shift):
+    """Changes the weights of a Dense or Conv2D layer to absorb x*scale + shift on its input.
+
+    returns: new list of weights, kernel and bias
+    """
+    kernel = weights[0]
+    bias = weights[1] if len(weights) > 1 else np.zeros(kernel.shape[-1], kernel.dtype)
+
+    if isinstance(layer, layers.Dense):
+        # a Flatten in between repeats the channels at every position
+        repeats = kernel.shape[0] // len(scale)
+        scale = np.tile(scale, repeats)
+        shift = np.tile(shift, repeats)
+        return [kernel * scale[:, np.newaxis], bias + shift @ kernel]
+
+    return [kernel * scale[np.newaxis, np.newaxis, :, np.newaxis],
+            bias + np.einsum('hwio,i->o', kernel, shift)]
+
+
+def fold_batchnorm(model):
+    """Makes a copy of a Sequential model with BatchNormalization folded in where it is exact.
+
+    returns: new model, names of the folded layers, names of the kept ones
+    """
+    model_layers = list(model.layers)
+    weights = [layer.get_weights() for layer in model_layers]
+    skip = set()
+    folded, kept = [], []
+
+    for i, layer in enumerate(model_layers):
+        if not isinstance(layer, layers.BatchNormalization):
+            continue
+        scale, shift = scale_and_shift(layer)
+        prev = model_layers[i - 1] if i > 0 else None
+
+        if (isinstance(prev, (layers.Dense, layers.Conv2D)) and i - 1 not in skip
+                and prev.get_config()['activation'] == 'linear'):
+            # the usual case: fold into the kernel and bias of the layer before
+            kernel = weights[i - 1][0]
+            bias = weights[i - 1][1] if len(weights[i - 1]) > 1 else 0
+            weights[i - 1] = [kernel * scale, bias * scale + shift]
+            target = i - 1
+        else:
+            target = fold_target(model_layers, i, scale)
+            if target is None:
+                kept.append(layer.name)
+                continue
+            weights[target] = fold_into(model_layers[target], weights[target], scale, shift)
+        skip.add(i)
+        folded.append(layer.name)
+
+    new_layers = []
+    for i, layer in enumerate(model_layers):
+        if i in skip:
+            continue
+        config = layer.get_config()
+        if isinstance(layer, (layers.Dense, layers.Conv2D)):
+            config['use_bias'] = True
+        new_layers.append(type(layer).from_config(config))
+
+    new_model = models.Sequential([layers.Input(model.input_shape[1:])] + new_layers,
+                                  name=model.name + '_folded')
+    for layer, w in zip(new_layers, [w for i, w in enumerate(weights) if i not in skip]):
+        layer.set_weights(w)
+    return new_model, folded, kept
+
+
+def representative_dataset(images, n_samples=500, seed=0):
+    """Returns a generator of single training images for int8 calibration."""
+    rng = np.random.default_rng(seed)
+    index = rng.choice(len(images), size=n_samples, replace=False)
+
+    def generator():
+        for i in index:
+            yield [images[i:i + 1].astype(np.float32) / 255]
+    return generator
+
+
+def convert(model, mode, calibration_images=None, n_samples=500):
+    """Converts a Keras model to TensorFlow Lite.
+
+    mode: 'float32', 'float16' or 'int8'
+    calibration_images: uint8 training images, needed for 'int8'
+    n_samples: number of them used for calibration
+
+    returns: bytes of the .tflite model
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if mode == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'int8':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(calibration_images, n_samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+class TFLiteModel:
+    """Runs a .tflite model, quantizing inputs and outputs if needed."""
+
+    def __init__(self, model_content, threads=1):
+        self.interpreter = tf.lite.Interpreter(model_content=model_content, num_threads=threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+
+    def predict(self, x):
+        """Returns the class probabilities for a batch of float images."""
+        interpreter = self.interpreter
+        if self.batch_size != len(x):
+            interpreter.resize_tensor_input(self.input['index'], [len(x)] + list(x.shape[1:]))
+            interpreter.allocate_tensors()
+            self.batch_size = len(x)
+
+        scale, zero_point = self.input['quantization']
+        if self.input['dtype'] != np.float32:
+            info = np.iinfo(self.input['dtype'])
+            x = np.clip(np.round(x / scale + zero_point), info.min, info.max)
+        interpreter.set_tensor(self.input['index'], x.astype(self.input['dtype']))
+        interpreter.invoke()
+        y = interpreter.get_tensor(self.output['index'])
+
+        scale, zero_point = self.output['quantization']
+        if self.output['dtype'] != np.float32:
+            y = (y.astype(np.float32) - zero_point) * scale
+        return y
+
+
+def accuracy(predict, images, labels, batch_size=250):
+    """Fraction of images whose most likely class is the label."""
+    correct = 0
+    for start in range(0, len(images), batch_size):
+        x = images[start:start + batch_size].astype(np.float32) / 255
+        probs = predict(x)
+        correct += np.sum(np.argmax(probs, axis=1) == labels[start:start + batch_size])
+    return correct / len(images)
+
+
+def latency(predict, image, runs=200):
+    """Median time in milliseconds to classify one image."""
+    x = image[np.newaxis].astype(np.float32) / 255
+    predict(x)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(x)
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Export the CNN to TensorFlow Lite.')
+    parser.add_argument('model', nargs='?', default='cnn_cifar10.keras', help='saved Keras model')
+    parser.add_argument('--output-dir', default='.', help='where to write the .tflite files')
+    parser.add_argument('--calibration-samples', type=int, default=500,
+                        help='training images used to calibrate int8')
+    parser.add_argument('--eval-samples', type=int, default=10000,
+                        help='test images used to measure accuracy')
+    parser.add_argument('--threads', type=int, default=1, help='threads for the interpreter')
+    options = parser.parse_args(args)
+
+    (train_images, _), (test_images, test_labels) = load_cifar()
+    test_images = test_images[:options.eval_samples]
+    test_labels = test_labels[:options.eval_samples]
+
+    model = tf.keras.models.load_model(options.model)
+    folded, folded_names, kept_names = fold_batchnorm(model)
+
+    x = test_images[:100].astype(np.float32) / 255
+    diff = np.max(np.abs(model.predict_on_batch(x) - folded.predict_on_batch(x)))
+    print('Folded %d BatchNormalization layers (%s), kept %d; max output change %.2g'
+          % (len(folded_names), ', '.join(folded_names) or 'none', len(kept_names), diff))
+
+    keras_predict = lambda x: model.predict_on_batch(x)
+    rows = [('keras', None, accuracy(keras_predict, test_images, test_labels),
+             latency(keras_predict, test_images[0]))]
+
+    os.makedirs(options.output_dir, exist_ok=True)
+    for mode in ['float32', 'float16', 'int8']:
+        content = convert(folded, mode, train_images, options.calibration_samples)
+        filename = os.path.join(options.output_dir, 'cnn_%s.tflite' % mode)
+        with open(filename, 'wb') as file:
+            file.write(content)
+
+        tflite = TFLiteModel(content, options.threads)
+        rows.append((mode, len(content), accuracy(tflite.predict, test_images, test_labels),
+                     latency(tflite.predict, test_images[0])))
+
+    base_acc, base_latency = rows[0][2], rows[0][3]
+    print('%-8s %10s %9s %9s %11s %9s' % ('model', 'size (kB)', 'accuracy', 'change',
+                                          'latency ms', 'speedup'))
+    for name, size, acc, ms in rows:
+        size = '-' if size is None else '%.1f' % (size / 1024)
+        print('%-8s %10s %8.2f%% %+8.2f%% %11.3f %8.1fx'
+              % (name, size, 100 * acc, 100 * (acc - base_acc), ms, base_latency / ms))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Batched inference with the CIFAR-10 classifier trained by cnn.py.
+
+Loads a saved model, decodes and resizes every image in a directory on
+several threads with tf.data, and runs the model on large batches
+instead of one image at a time.  Prints the most likely class and its
+confidence for each image, then the throughput.
+
+The model ends in a softmax, so its outputs are already probabilities;
+they are used as they are.  Images are scaled to values between 0 and 1,
+like the training images.
+
+Usage:
+
+    python predict.py cnn_cifar10.keras photos/
+    python predict.py cnn_cifar10.keras photos/ --batch-size 1024 -o predictions.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+class_names = ['airplane', 'automobile', 'bird', 'cat', 'deer',
+               'dog', 'frog', 'horse', 'ship', 'truck']
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+
+def list_images(directory):
+    """Returns the sorted paths of the image files in a directory."""
+    names = sorted(os.listdir(directory))
+    return [os.path.join(directory, name) for name in names
+            if name.lower().endswith(EXTENSIONS)]
+
+
+def load_image(path, size=(32, 32)):
+    """Reads, decodes and resizes one image.
+
+    The format is detected from the contents, so the file name does not
+    need an extension.
+
+    returns: float32 tensor of shape size + (3,), values between 0 and 1
+    """
+    data = tf.io.read_file(path)
+    img = tf.io.decode_image(data, channels=3, expand_animations=False)
+    img.set_shape([None, None, 3])
+    # antialias, since most photos are shrunk a lot
+    img = tf.image.resize(img, size, antialias=True)
+    return img / 255.0
+
+
+def image_dataset(paths, batch_size=256, size=(32, 32)):
+    """Makes a pipeline that loads the images in parallel, in order.
+
+    returns: tf.data.Dataset of image batches
+    """
+    ds = tf.data.Dataset.from_tensor_slices(list(paths))
+    ds = ds.map(lambda path: load_image(path, size),
+                num_parallel_calls=AUTOTUNE, deterministic=True)
+    return ds.batch(batch_size).prefetch(AUTOTUNE)
+
+
+def predict_files(model, paths, batch_size=256):
+    """Classifies image files.
+
+    model: Keras model with softmax outputs
+    paths: list of image file names
+
+    returns: list of (path, class name, confidence)
+    """
+    paths = list(paths)
+    if not paths:
+        return []
+    size = tuple(model.input_shape[1:3])
+    probs = model.predict(image_dataset(paths, batch_size, size), verbose=0)
+    best = np.argmax(probs, axis=1)
+    confidence = probs[np.arange(len(probs)), best]
+    return [(path, class_names[i], float(c))
+            for path, i, c in zip(paths, best, confidence)]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Classify a directory of images.')
+    parser.add_argument('model', help='saved model, e.g. cnn_cifar10.keras')
+    parser.add_argument('directory', help='directory of images')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('-o', '--output', help='also write the results to a CSV file')
+    options = parser.parse_args(args)
+
+    paths = list_images(options.directory)
+    if not paths:
+        print('No images found in ' + options.directory)
+        return 1
+
+    model = tf.keras.models.load_model(options.model)
+
+    start = time.perf_counter()
+    results = predict_files(model, paths, options.batch_size)
+    elapsed = time.perf_counter() - start
+
+    for path, label, confidence in results:
+        print('%s\t%s\t%.2f%%' % (path, label, 100 * confidence))
+    print('%d images in %.2f s, %.1f images/s'
+          % (len(results), elapsed, len(results) / elapsed), file=sys.stderr)
+
+    if options.output:
+        with open(options.output, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['file', 'class', 'confidence'])
+            writer.writerows(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""Trains the CIFAR-10 network from cnn.py, with faster training modes.
+
+    --jit          compile the training step with XLA (jit_compile=True)
+    --bf16         mixed precision: compute in bfloat16, keep the weights
+                   in float32; only on CPUs with native bfloat16
+                   (AVX512_BF16 or AMX), otherwise it is slower
+    --batch-size   larger batches, with the learning rate scaled by the
+                   same factor (linear scaling from 0.001 at 64)
+
+Training saves a backup every epoch to --checkpoint-dir and picks up
+from it, with the best accuracy and patience so far, if it is run again
+after being interrupted.  The model with the
+best validation accuracy is kept in best.keras there, the learning rate
+is halved when validation accuracy stops improving, training stops once
+it has not improved for --patience epochs, and each epoch's metrics and
+time go to log.csv.
+
+--benchmark trains every combination for a few epochs and reports the
+time per epoch and the test accuracy of each.  Check it before turning
+on --jit: on CPUs, XLA's convolutions can be slower than the default
+oneDNN kernels.
+
+Usage:
+
+    python train.py --jit --bf16 --batch-size 256
+    python train.py --checkpoint-dir run1 --patience 30
+    python train.py --benchmark --epochs 3
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import mixed_precision
+
+from cifar_cache import load_cifar
+from cnn_model import build_model
+from input_pipeline import train_dataset, test_dataset
+
+BASE_BATCH_SIZE = 64
+BASE_LEARNING_RATE = 1e-3
+
+# name: (jit_compile, bf16, batch_size)
+CONFIGS = {
+    'baseline': (False, False, 64),
+    'xla': (True, False, 64),
+    'bf16': (False, True, 64),
+    'xla+bf16': (True, True, 64),
+    'xla+bf16 x4 batch': (True, True, 256),
+}
+
+
+def bf16_supported():
+    """Checks whether the CPU computes in bfloat16 natively."""
+    try:
+        with open('/proc/cpuinfo') as file:
+            flags = file.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    """Records how long each epoch takes."""
+
+    def on_train_begin(self, logs=None):
+        self.times = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.times.append(time.perf_counter() - self.start)
+        if logs is not None:
+            logs['epoch_time'] = self.times[-1]
+
+
+def read_log(filename, monitor='val_accuracy'):
+    """Finds the best epoch in a CSVLogger log.
+
+    returns: (best value, its epoch, last epoch), or None if the log has
+             no epochs
+    """
+    try:
+        with open(filename, newline='') as file:
+            rows = [row for row in csv.DictReader(file) if row.get(monitor)]
+    except FileNotFoundError:
+        return None
+    if not rows:
+        return None
+    epochs = [int(row['epoch']) for row in rows]
+    values = [float(row[monitor]) for row in rows]
+    best = int(np.argmax(values))
+    return values[best], epochs[best], epochs[-1]
+
+
+class RestoreMonitorState(tf.keras.callbacks.Callback):
+    """Gives EarlyStopping and ReduceLROnPlateau back their counters after a resume.
+
+    BackupAndRestore brings back the weights, the optimizer and the
+    epoch, but the other callbacks start from scratch.  This goes after
+    them in the list, so it runs after they have reset themselves.
+    """
+
+    def __init__(self, early_stopping, reduce_lr, best, best_epoch, last_epoch, best_model=None):
+        """
+        best, best_epoch, last_epoch: from read_log
+        best_model: file with the best model so far, for EarlyStopping's best weights
+        """
+        super().__init__()
+        self.early_stopping = early_stopping
+        self.reduce_lr = reduce_lr
+        self.best = best
+        self.best_epoch = best_epoch
+        self.last_epoch = last_epoch
+        self.best_model = best_model
+
+    def on_train_begin(self, logs=None):
+        since_best = self.last_epoch - self.best_epoch
+        early_stopping = self.early_stopping
+        early_stopping.best = self.best
+        early_stopping.best_epoch = self.best_epoch
+        early_stopping.wait = since_best
+        if early_stopping.restore_best_weights and self.best_model \
+                and os.path.exists(self.best_model):
+            early_stopping.best_weights = tf.keras.models.load_model(
+                self.best_model).get_weights()
+
+        # the learning rate itself is restored with the optimizer, which is
+        # backed up after reduce_lr has acted on the epoch; without a
+        # cooldown, the wait starts again at 0 after every reduction
+        self.reduce_lr.best = self.best
+        self.reduce_lr.wait = since_best % self.reduce_lr.patience
+
+
+def make_callbacks(checkpoint_dir='checkpoints', patience=20, lr_patience=8):
+    """Makes the callbacks for a long training run.
+
+    If checkpoint_dir has a backup of an interrupted run, training
+    resumes from it: the best val_accuracy so far and the epochs since
+    then are read from log.csv, so the best model isn't overwritten by a
+    worse one and the patience counts on, and the log is appended to.
+    Otherwise the log is started again.
+
+    checkpoint_dir: directory for the backup, the best model and the log
+    patience: epochs without improvement in val_accuracy before stopping
+    lr_patience: epochs without improvement before halving the learning rate
+
+    returns: list of callbacks
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    backup_dir = os.path.join(checkpoint_dir, 'backup')
+    best_model = os.path.join(checkpoint_dir, 'best.keras')
+    log_file = os.path.join(checkpoint_dir, 'log.csv')
+    # BackupAndRestore deletes the backup when training finishes
+    resuming = os.path.isdir(backup_dir) and bool(os.listdir(backup_dir))
+    state = read_log(log_file) if resuming else None
+
+    early_stopping = tf.keras.callbacks.EarlyStopping(monitor='val_accuracy', mode='max',
+                                                      patience=patience,
+                                                      restore_best_weights=True)
+    reduce_lr = tf.keras.callbacks.ReduceLROnPlateau(monitor='val_accuracy', mode='max',
+                                                     factor=0.5, patience=lr_patience,
+                                                     min_lr=1e-5)
+    callbacks = [
+        # goes first, so the other callbacks see the epoch time
+        EpochTimer(),
+        tf.keras.callbacks.ModelCheckpoint(best_model, monitor='val_accuracy', mode='max',
+                                           save_best_only=True,
+                                           initial_value_threshold=state and state[0]),
+        early_stopping,
+        reduce_lr,
+        tf.keras.callbacks.CSVLogger(log_file, append=resuming),
+        # resumes from the last epoch if the run was interrupted; goes after
+        # the others, so the backup has the learning rate reduce_lr set and
+        # the epoch is already in the log
+        tf.keras.callbacks.BackupAndRestore(backup_dir),
+    ]
+    if state is not None:
+        callbacks.append(RestoreMonitorState(early_stopping, reduce_lr, *state, best_model))
+    return callbacks
+
+
+def scaled_learning_rate(batch_size):
+    """Learning rate for a batch size, scaled linearly from the base."""
+    return BASE_LEARNING_RATE * batch_size / BASE_BATCH_SIZE
+
+
+def compile_model(jit_compile=False, bf16=False, batch_size=BASE_BATCH_SIZE):
+    """Builds and compiles the network for one training mode.
+
+    Sets the global dtype policy, which applies to models built later too.
+
+    returns: compiled model
+    """
+    if bf16 and not bf16_supported():
+        print('This CPU has no native bfloat16; training in float32')
+        bf16 = False
+    mixed_precision.set_global_policy('mixed_bfloat16' if bf16 else 'float32')
+
+    model = build_model()
+    optimizer = tf.keras.optimizers.Adam(scaled_learning_rate(batch_size))
+    model.compile(optimizer=optimizer, loss='sparse_categorical_crossentropy',
+                  metrics=['accuracy'], jit_compile=jit_compile)
+    return model
+
+
+def train(data, epochs=200, jit_compile=False, bf16=False, batch_size=BASE_BATCH_SIZE,
+          callbacks=None, verbose=2):
+    """Trains the network in one mode.
+
+    data: ((train_images, train_labels), (test_images, test_labels)),
+          e.g. from cifar_cache.load_cifar; labels are class numbers
+    callbacks: list of callbacks, e.g. from make_callbacks
+
+    returns: model, history, list of epoch times in seconds
+    """
+    (train_images, train_labels), (test_images, test_labels) = data
+    model = compile_model(jit_compile, bf16, batch_size)
+
+    callbacks = list(callbacks or [])
+    timers = [callback for callback in callbacks if isinstance(callback, EpochTimer)]
+    if not timers:
+        timers = [EpochTimer()]
+        callbacks.insert(0, timers[0])
+
+    train_ds = train_dataset(train_images, train_labels, batch_size=batch_size)
+    test_ds = test_dataset(test_images, test_labels)
+    history = model.fit(train_ds, epochs=epochs, validation_data=test_ds,
+                        callbacks=callbacks, verbose=verbose)
+    return model, history, timers[0].times
+
+
+def benchmark(data, epochs=3, configs=None):
+    """Trains every configuration and compares the time per epoch and accuracy.
+
+    The first epoch includes tracing and compiling, so it is reported
+    separately from the other epochs.
+
+    returns: dictionary from configuration name to results
+    """
+    if configs is None:
+        configs = list(CONFIGS)
+    results = {}
+    for name in configs:
+        jit_compile, bf16, batch_size = CONFIGS[name]
+        if bf16 and not bf16_supported():
+            print('skipping %s: this CPU has no native bfloat16' % name)
+            continue
+        print('training %s' % name)
+        model, history, times = train(data, epochs, jit_compile, bf16, batch_size, verbose=0)
+        results[name] = dict(
+            batch_size=batch_size,
+            learning_rate=scaled_learning_rate(batch_size),
+            first_epoch=times[0],
+            epoch_time=np.median(times[1:]) if len(times) > 1 else times[0],
+            test_accuracy=history.history['val_accuracy'][-1],
+        )
+    mixed_precision.set_global_policy('float32')
+
+    base = results.get('baseline')
+    print('%-20s %6s %8s %12s %12s %8s %9s' % ('config', 'batch', 'lr', 'first epoch',
+                                               's/epoch', 'speedup', 'accuracy'))
+    for name, r in results.items():
+        speedup = base['epoch_time'] / r['epoch_time'] if base else np.nan
+        print('%-20s %6d %8.4f %11.1fs %11.1fs %7.2fx %8.2f%%'
+              % (name, r['batch_size'], r['learning_rate'], r['first_epoch'],
+                 r['epoch_time'], speedup, 100 * r['test_accuracy']))
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Train the CIFAR-10 CNN.')
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=BASE_BATCH_SIZE,
+                        help='the learning rate is scaled with it')
+    parser.add_argument('--jit', action='store_true', help='compile with XLA')
+    parser.add_argument('--bf16', action='store_true', help='bfloat16 mixed precision')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='compare all modes for --epochs epochs each')
+    parser.add_argument('--save', default='cnn_cifar10.keras', help='where to save the model')
+    parser.add_argument('--checkpoint-dir', default='checkpoints',
+                        help='backups, best model and log; rerun to resume')
+    parser.add_argument('--patience', type=int, default=20,
+                        help='epochs without improvement before stopping')
+    options = parser.parse_args(args)
+
+    data = load_cifar()
+    if options.benchmark:
+        benchmark(data, options.epochs)
+        return 0
+
+    callbacks = make_callbacks(options.checkpoint_dir, options.patience)
+    model, history, times = train(data, options.epochs, options.jit, options.bf16,
+                                  options.batch_size, callbacks)
+    # the best weights are restored at the end
+    print('%d epochs, %.1f s per epoch, %.0f s in all, best test accuracy %.2f%%'
+          % (len(times), np.median(times), np.sum(times),
+             100 * np.max(history.history['val_accuracy'])))
+    model.save(options.save)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
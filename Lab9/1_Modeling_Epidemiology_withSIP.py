@@ -347,6 +347,21 @@ results.head()
 plot_results(results.S, results.I, results.D, results.A, results.R, results.T, results.H, results.E)
 
 
+# ### Running an ensemble
+# 
+# To explore many parameter sets at once, `run_ensemble` advances every scenario together as NumPy arrays.  Each row of `params` holds the 16 parameters in the same order as `make_system`, and the result is a cube with one row per scenario, one page per day, and one column per compartment.
+
+# In[23]:
+
+
+from sidarthe_ensemble import run_ensemble, DEFAULT_PARAMS
+
+params = np.tile(DEFAULT_PARAMS, (1000, 1))
+params[:, 0] = linspace(0.3, 0.8, 1000)
+cube = run_ensemble(params)
+cube.shape
+
+
 # In[ ]:
 
 
@@ -0,0 +1,123 @@
+"""Vectorized ensemble runner for the SIDARTHE model in
+1_Modeling_Epidemiology_withSIP.py.
+
+Instead of stepping one State at a time, `run_ensemble` advances every
+scenario in a parameter matrix together, using one NumPy array per
+compartment, and returns the whole history as a result cube.
+
+Example:
+
+    params = np.tile(DEFAULT_PARAMS, (10000, 1))
+    params[:, 0] = np.linspace(0.3, 0.8, 10000)     # sweep alpha
+    cube = run_ensemble(params)
+    cube.shape     # (10000, 197, 8)
+"""
+
+import numpy as np
+
+# the order of the parameters, same as the arguments of make_system
+PARAM_NAMES = ('alpha', 'beta', 'delta', 'gamma', 'epsilon', 'theta',
+               'zeta', 'eta', 'mu', 'nu', 'tau', 'lamda',
+               'rho', 'kappa', 'ksi', 'sigma')
+
+# the order of the compartments, same as the State in make_system
+STATE_NAMES = ('S', 'I', 'D', 'A', 'R', 'T', 'H', 'E')
+
+# the hypothetical values used in the notebook
+DEFAULT_PARAMS = np.array([0.57, 0.011, 0.011, 0.456, 0.171, 0.371,
+                           0.125, 0.125, 0.017, 0.027, 0.01, 0.034,
+                           0.034, 0.017, 0.017, 0.017])
+
+
+def make_init():
+    """Make the initial state used by make_system.
+
+    returns: array of fractions, in the order of STATE_NAMES
+    """
+    init = np.array([1-200/60e6-20/60e6-1/60e6-2/60e6, 200/60e6,
+                     20/60e6, 1/60e6, 2/60e6, 0, 0, 0])
+    return init / init.sum()
+
+
+def run_ensemble(params, init=None, t0=0, t_end=7*28):
+    """Runs the SIDARTHE model for many parameter sets at once.
+
+    Each step applies the same update as update_func, with the same
+    order of operations, so every scenario matches run_simulation.
+
+    params: array with shape (n_scenarios, 16), columns in the
+            order of PARAM_NAMES
+    init: initial state, either one state with 8 elements or an
+          array with shape (n_scenarios, 8); default is make_init()
+    t0: start time in days
+    t_end: end time in days
+
+    returns: array with shape (n_scenarios, n_days, 8), where
+             n_days = t_end - t0 + 1 and the first day is the
+             initial state
+    """
+    params = np.asarray(params, dtype=np.float64)
+    if params.ndim == 1:
+        params = params[np.newaxis, :]
+    if params.shape[1] != len(PARAM_NAMES):
+        msg = 'params should have %d columns, one for each of %s' % (
+            len(PARAM_NAMES), ', '.join(PARAM_NAMES))
+        raise ValueError(msg)
+
+    n_scenarios = len(params)
+    n_days = int(t_end - t0) + 1
+
+    if init is None:
+        init = make_init()
+    state = np.empty((n_scenarios, len(STATE_NAMES)))
+    state[:] = init
+
+    (alpha, beta, delta, gamma, epsilon, theta, zeta, eta,
+     mu, nu, tau, lamda, rho, kappa, ksi, sigma) = params.T
+
+    cube = np.empty((n_scenarios, n_days, len(STATE_NAMES)))
+    cube[:, 0] = state
+
+    # one view per compartment; the updates below modify them in place
+    s, i, d, a, r, t, h, e = state.T
+
+    for day in range(1, n_days):
+        infected1 = alpha * i * s
+        infected2 = (epsilon + ksi + lamda) * i
+        infected3 = epsilon * i
+        infected4 = zeta * i
+        infected5 = lamda * i
+
+        diagnosed1 = beta * d * s
+        diagnosed2 = (eta + rho) * d
+        diagnosed3 = eta * d
+        diagnosed4 = rho * d
+
+        ailing1 = gamma * a * s
+        ailing2 = (theta + mu + kappa) * a
+        ailing3 = theta * a
+        ailing4 = mu * a
+        ailing5 = kappa * a
+
+        recognized1 = delta * r * s
+        recognized2 = (nu + ksi) * r
+        recognized3 = nu * r
+        recognized4 = ksi * r
+
+        threatened = (nu + ksi) * t
+        threatened1 = sigma * t
+
+        extinct = tau * t
+
+        s -= infected1 + diagnosed1 + ailing1 + recognized1
+        i += (infected1 + diagnosed1 + ailing1 + recognized1) - infected2
+        d += infected3 - diagnosed2
+        a += infected4 - ailing2
+        r += diagnosed3 + ailing3 - recognized2
+        t += ailing4 + recognized3 - threatened
+        h += infected5 + diagnosed4 + ailing5 + recognized4 + threatened1
+        e += extinct
+
+        cube[:, day] = state
+
+    return cube
@@ -0,0 +1,112 @@
+"""Loads the sprites from the atlas that build_atlas.py makes.
+
+The atlas is loaded from its raw pixels, atlas.rgba, and converted to
+the display's pixel format once (convert_alpha); every sprite is a
+subsurface of it.  So there are no PNGs to decode at startup, and
+nothing to convert later.  Opaque sprites, like the backgrounds, are copied out
+with convert() instead, because a surface without alpha blits several
+times faster than one with it.
+
+install() puts the sprites in pgzero's image cache, so Actor("bird-up")
+and screen.blit("background", ...) use them without any other change.
+A game calls it at the top, after the imports; the games are one
+folder down from this file, so they add that folder to the path first,
+and still run without it:
+
+    sys.path.append(os.path.join(pgzero.loaders.root, os.pardir))
+    try:
+        import atlas
+    except ImportError:
+        pass
+    else:
+        atlas.install()
+
+Sprites whose PNG has changed since the atlas was built are left out,
+and pgzero loads them from their own files as before.  If there is no
+atlas, install() does nothing.
+"""
+
+import json
+import os
+
+ATLAS_IMAGE = "atlas.png"
+ATLAS_PIXELS = "atlas.rgba"
+ATLAS_INDEX = "atlas.json"
+
+# atlases already loaded: directory -> (time built, sprites)
+_loaded = {}
+
+
+def read_index(directory):
+    """Reads atlas.json from directory, or returns None if there isn't one."""
+    try:
+        with open(os.path.join(directory, ATLAS_INDEX)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def is_stale(directory, sprite, built):
+    """Checks whether a sprite's PNG has changed since the atlas was built at time built."""
+    try:
+        stat = os.stat(os.path.join(directory, sprite["source"]))
+    except FileNotFoundError:
+        # the atlas still has it
+        return False
+    return stat.st_size != sprite["source_bytes"] or stat.st_mtime > built
+
+
+def load_atlas(directory):
+    """Loads the sprites from the atlas in directory.
+
+    The display has to be set up first, as pgzero does before it runs
+    the game.  An atlas is only loaded again if it has been rebuilt.
+
+    returns: dictionary from name to pygame Surface; empty if there is
+             no atlas
+    """
+    import pygame
+
+    index = read_index(directory)
+    if index is None:
+        return {}
+    built = os.path.getmtime(os.path.join(directory, ATLAS_INDEX))
+    if directory in _loaded and _loaded[directory][0] == built:
+        return _loaded[directory][1]
+    size = tuple(index["size"])
+    try:
+        with open(os.path.join(directory, index["pixels"]), "rb") as file:
+            pixels = file.read()
+    except (KeyError, FileNotFoundError):
+        pixels = None
+    if pixels is not None and len(pixels) == size[0] * size[1] * 4:
+        sheet = pygame.image.frombuffer(pixels, size, "RGBA").convert_alpha()
+    else:
+        sheet = pygame.image.load(os.path.join(directory, index["image"])).convert_alpha()
+
+    sprites = {}
+    for name, sprite in index["sprites"].items():
+        if is_stale(directory, sprite, built):
+            continue
+        surface = sheet.subsurface(pygame.Rect(sprite["rect"]))
+        sprites[name] = surface.convert() if sprite["opaque"] else surface
+    _loaded[directory] = built, sprites
+    return sprites
+
+
+def install(directory=None):
+    """Puts the atlas sprites in pgzero's image cache.
+
+    directory: images directory, default is the one pgzero loads from
+
+    returns: number of sprites installed
+    """
+    from pgzero import loaders
+
+    images = loaders.images
+    if directory is None:
+        directory = os.path.join(loaders.root, images.subpath)
+    sprites = load_atlas(directory)
+    for name, surface in sprites.items():
+        images.cache[images.cache_key(name, (), {})] = surface
+    return len(sprites)
@@ -5,14 +5,31 @@ Created on Mon Apr 25 15:39:04 2022
 @author: jlong
 """
 
+import os
+import sys
 import pgzrun
 import pygame
 import pgzero
 import random
 import matplotlib.animation as animate
+import numpy as np
 from pgzero.builtins import Actor
 from random import randint
 
+from high_scores import HighScoreStore
+from world import FRAME_RATE, FixedTimestep, Obstacles
+
+#load the sprites from the atlas, if build_atlas.py has made one;
+#atlas.py is in the folder above this game's folder (pgzero's loader
+#root; __file__ is pgzero's own after "import pgzrun")
+sys.path.append(os.path.join(pgzero.loaders.root, os.pardir))
+try:
+    import atlas
+except ImportError:
+    pass
+else:
+    atlas.install()
+
 #Game dimension
 display = pygame.display.set_mode((800,600))
 
@@ -29,56 +46,50 @@ pygame.mixer.music.play(-1)
 balloon = Actor("balloon")
 balloon.pos = 400, 300
 
-#bird position
-bird = Actor("bird-up")
-bird.pos = randint(800, 1600), randint(10, 200)
+#falls 1 pixel per frame at 60 fps
+FALL_SPEED = 1 * FRAME_RATE
+
+#obstacles: positions and speeds are kept in arrays by world.py,
+#the actors are only used to draw them
+obstacles = Obstacles(np.random.default_rng(randint(0, 2**32 - 1)))
+obstacle_actors = []
+
+def add_obstacle(images, y_range, speed, pass_edge="center", flap_ticks=0):
+    actor = Actor(images[0])
+    obstacles.add(images, (actor.width, actor.height), y_range, speed, pass_edge, flap_ticks)
+    obstacle_actors.append(actor)
 
-#house position
-house = Actor("house")
-house.pos = randint(800, 1600), 460
+#bird flies at 5 pixels per frame and flaps every 10 frames
+add_obstacle(("bird-up", "bird-down"), (10, 200), 5, flap_ticks=10)
+#house and tree scroll at 2 pixels per frame
+add_obstacle(("house",), (460, 460), 2, pass_edge="right")
+add_obstacle(("tree",), (450, 450), 2, pass_edge="right")
 
-#tree position
-tree = Actor("tree")
-tree.pos = randint(800, 1600), 450
+#the game moves in fixed ticks of 1/60 s, whatever the frame rate
+timestep = FixedTimestep()
 
 #global variables
-bird_up = True
 up = False
 game_over = False 
 score = 0
-number_of_updates = 0
 lives = 1
 health = 100
 alive = True
 
-#scores array
-scores = []
+#top 5 scores, saved to the file in the background
+high_scores = HighScoreStore(r"high-scores.txt", size=5)
 
 # Update high scores
 def update_high_scores():
-    global score, scores
-    filename = r"high-scores.txt"
-    scores=[]
-    with open(filename, "r") as file:
-        line = file.readline()
-        high_scores = line.split()
-        for high_score in high_scores:
-            if (score > int(high_score)):
-                scores.append(str(score) + " ")
-                score = int(high_score)
-            else:
-                scores.append(str(high_score) + " ")
-    with open(filename, "w") as file:
-        for high_score in scores:
-            file.write(high_score)
+    high_scores.add(score)
 
 # Display high scores
 def display_high_scores():
     screen.draw.text("HIGH SCORES", (350, 150), color="black")
     y = 175
     position = 1
-    for high_score in scores:
-        screen.draw.text(str(position) + ". " + high_score, (350, y), color="black")
+    for high_score in high_scores.scores():
+        screen.draw.text(str(position) + ". " + str(high_score), (350, y), color="black")
         y += 25
         position += 1
 
@@ -89,9 +100,10 @@ def draw():
     screen.blit("background", (0, 0))
     if not game_over:
         balloon.draw()
-        bird.draw()
-        house.draw()
-        tree.draw()
+        for i, actor in enumerate(obstacle_actors):
+            actor.image = obstacles.image(i)
+            actor.pos = obstacles.pos[i]
+            actor.draw()
         pygame.draw.rect(display, RED, (100,5,100,15))
         pygame.draw.rect(display, GREEN, (100,5,health,15))
         screen.draw.text("Lives: " +str(lives), (600, 5), color="black")
@@ -108,63 +120,36 @@ def on_mouse_up():
     global up
     up = False
     
-def flap():
-    global bird_up
-    if bird_up:
-        bird.image = "bird-down"
-        bird_up = False
-    else:
-        bird.image = "bird-up"
-        bird_up = True
-            
-        
-def update():
-    global game_over, score, number_of_updates, lives, health, alive        
+# one tick of the game; returns True when the game is over
+def tick(dt):
+    global game_over, score, lives, health, alive
+    if not up:
+        balloon.y += FALL_SPEED * dt
+
+    # one point for every obstacle that gets past the balloon
+    score += obstacles.step(dt, balloon.x)
+
+    if balloon.top < 0 or balloon.bottom > 560:
+        game_over = True
+        update_high_scores()
+        return True
+
+    if len(obstacles.hits(balloon.left, balloon.top, balloon.right, balloon.bottom)):
+        if health > 0:
+            health -= 1
+            if health == 0 and lives > 0:
+                lives -=1
+                health = 100
+            elif health == 0 and lives == 0:
+                alive = False
+                game_over = True
+                update_high_scores()
+                return True
+    return False
+
+def update(dt):
     if not game_over:
-        if not up:
-            balloon.y += 1
-            
-        if bird.x > balloon.x:
-            bird.x -= 5
-            if number_of_updates == 9:
-                flap()
-                number_of_updates = 0
-            else:
-                number_of_updates += 1
-        else:
-            bird.x = randint(800, 1600)
-            bird.y = randint(10, 200)
-            score += 1
-            number_of_updates = 0
-            
-        if house.right > balloon.x:
-            house.x -= 2
-        else:
-            house.x = randint(800, 1600)
-            score += 1
-            
-        if tree.right > balloon.x:
-            tree.x -= 2
-        else: 
-            tree.x = randint(800, 1600)
-            score += 1
-            
-        if balloon.top < 0 or balloon.bottom > 560:
-            game_over = True
-            update_high_scores()
-            
-        if balloon.collidepoint(bird.x, bird.y) or \
-           balloon.collidepoint(house.x, house.y) or \
-           balloon.collidepoint(tree.x, tree.y):
-               if health > 0:
-                   health -= 1
-                   if health == 0 and lives > 0:
-                       lives -=1
-                       health = 100
-                   elif health == 0 and lives == 0:
-                       alive = False
-                       game_over = True
-                       update_high_scores()
+        timestep.advance(dt, tick)
             
 pgzrun.go()
 
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+High score table for balloon.py.
+
+The scores are kept in memory, best first, and never more than `size`
+of them.  A new score goes in with bisect, after any equal scores, so
+older scores keep their place on ties.
+
+The file keeps the old format, scores separated by spaces on one line.
+It is never rewritten in place: the new table is written to a temporary
+file in the same directory, flushed to disk, and renamed over the old
+one, so a crash leaves either the old table or the new one.  Saving
+happens on a background thread, so the game doesn't wait for the disk;
+scores added while a save is running are written together in the next
+one.  Pending saves are finished when the program exits.
+"""
+
+import atexit
+import bisect
+import os
+import shutil
+import tempfile
+import threading
+
+
+class HighScoreStore:
+    """Top scores, saved to a file in the background."""
+
+    def __init__(self, filename, size=5, background=True):
+        """
+        filename: file with the scores
+        size: number of scores to keep
+        background: whether to save on a background thread
+        """
+        self.filename = filename
+        self.size = size
+        # negated, so the list is in ascending order for bisect
+        self._keys = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._version = 0
+        self._saved_version = 0
+        self._closing = False
+        self._thread = None
+        self.load()
+
+        if background:
+            self._thread = threading.Thread(target=self._writer, name='high-scores', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def load(self):
+        """Reads the scores from the file; a missing file means no scores yet."""
+        try:
+            with open(self.filename) as file:
+                words = file.read().split()
+        except FileNotFoundError:
+            words = []
+        scores = []
+        for word in words:
+            try:
+                scores.append(int(word))
+            except ValueError:
+                continue
+        # sorted is stable, so equal scores keep their order
+        scores = sorted(scores, reverse=True)[:self.size]
+        with self._lock:
+            self._keys = [-score for score in scores]
+
+    def scores(self):
+        """Returns the scores, best first."""
+        with self._lock:
+            return [-key for key in self._keys]
+
+    def add(self, score):
+        """Adds a score, and saves the table if it changed.
+
+        returns: position in the table, starting at 1, or None if the
+                 score isn't high enough
+        """
+        with self._lock:
+            # after equal scores, which were there first
+            index = bisect.bisect_right(self._keys, -score)
+            if index >= self.size:
+                return None
+            self._keys.insert(index, -score)
+            del self._keys[self.size:]
+            self._version += 1
+            self._changed.notify()
+
+        if self._thread is None:
+            self.save()
+        return index + 1
+
+    def save(self):
+        """Writes the table to the file, atomically."""
+        with self._lock:
+            scores = [-key for key in self._keys]
+            version = self._version
+        write_atomic(self.filename, ''.join(str(score) + ' ' for score in scores))
+        with self._lock:
+            if version > self._saved_version:
+                self._saved_version = version
+            self._changed.notify_all()
+
+    def _writer(self):
+        """Background thread: saves whenever the table has changed."""
+        while True:
+            with self._lock:
+                while self._version == self._saved_version and not self._closing:
+                    self._changed.wait()
+                if self._version == self._saved_version:
+                    return
+            try:
+                self.save()
+            except OSError as e:
+                print('Could not save high scores:', e)
+                with self._lock:
+                    # give up on this version rather than retrying forever
+                    self._saved_version = self._version
+                    self._changed.notify_all()
+
+    def flush(self, timeout=None):
+        """Waits until everything added so far is saved.
+
+        returns: True if it was saved in time
+        """
+        with self._lock:
+            return self._changed.wait_for(lambda: self._saved_version == self._version,
+                                          timeout)
+
+    def close(self):
+        """Finishes pending saves and stops the background thread."""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._closing = True
+            self._changed.notify_all()
+        self._thread.join()
+        self._thread = None
+
+
+def current_umask():
+    """Returns the process's umask, which can only be read by setting it."""
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def write_atomic(filename, text):
+    """Replaces a file's contents so that a crash leaves the old or the new version."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filename),
+                               suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp makes the file private; keep the permissions the old file had
+        try:
+            shutil.copymode(filename, tmp)
+        except FileNotFoundError:
+            os.chmod(tmp, 0o666 & ~current_umask())
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    # make the rename itself durable; directories can't be opened on Windows
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
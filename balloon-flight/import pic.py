@@ -5,7 +5,14 @@ Created on Mon Feb  7 17:11:27 2022
 @author: pc
 """
 
+import sys
 from PIL import Image 
-image = Image.open(r"D:/Spring 2022/EE 104/Lab 8/balloon-flight/images/bg3.png") 
-image = image.resize((132,200),Image.ANTIALIAS) 
-image.save(fp="4.png") 
\ No newline at end of file
+
+#usage: python "import pic.py" input.png output.png [width height]
+#to scale the sprites in images/ for the games, use
+#build_atlas.py --size NAME=WxH instead, which scales them into the atlas
+source, target = sys.argv[1], sys.argv[2]
+size = (int(sys.argv[3]), int(sys.argv[4])) if len(sys.argv) > 4 else (132, 200)
+image = Image.open(source) 
+image = image.resize(size, Image.LANCZOS) 
+image.save(fp=target) 
\ No newline at end of file
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Simulation core for balloon.py.
+
+The obstacles (birds, houses, trees, as many as you like) live in
+arrays: one row per obstacle for position, velocity and size, so moving,
+respawning and scoring them is a few numpy operations no matter how
+many there are.  Collisions go through a uniform grid: obstacles are
+sorted by the cell their centre is in, and a query only looks at the
+cells its rectangle covers.
+
+Speeds are in pixels per second, so the game runs at the same speed at
+any frame rate.  FixedTimestep runs the simulation in ticks of exactly
+1/60 s, however long the frames take, which keeps it deterministic.
+
+Run this file for a headless benchmark:
+
+    python world.py              # 500 obstacles
+    python world.py 5000
+"""
+
+import sys
+import time
+
+import numpy as np
+
+# the game used to move things a fixed number of pixels per frame at 60 fps
+FRAME_RATE = 60
+TICK = 1 / FRAME_RATE
+
+# where obstacles come back in, off the right edge of the screen
+SPAWN_X = (800, 1600)
+
+
+def per_second(pixels_per_frame):
+    """Converts a speed in pixels per frame at FRAME_RATE to pixels per second."""
+    return pixels_per_frame * FRAME_RATE
+
+
+class FixedTimestep:
+    """Runs a simulation in fixed ticks, however long the frames take."""
+
+    def __init__(self, tick=TICK, max_ticks=5):
+        """
+        tick: length of a tick in seconds
+        max_ticks: most ticks in one frame; after a long pause the
+                   simulation skips ahead instead of trying to catch up
+        """
+        self.tick = tick
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+
+    def advance(self, dt, step):
+        """Calls step(tick) once for every whole tick in dt plus what was left over.
+
+        step can return True to stop early, e.g. at game over.
+
+        returns: number of ticks run
+        """
+        self.accumulator += dt
+        n = 0
+        while self.accumulator >= self.tick and n < self.max_ticks:
+            self.accumulator -= self.tick
+            n += 1
+            if step(self.tick):
+                self.accumulator = 0.0
+                break
+        if n == self.max_ticks:
+            self.accumulator = min(self.accumulator, self.tick)
+        return n
+
+
+class SpatialGrid:
+    """Uniform grid over a set of points, for finding the ones in a rectangle."""
+
+    # rows of cells are this far apart in the sorted keys
+    STRIDE = 1 << 32
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.order = np.zeros(0, dtype=np.intp)
+        self.keys = np.zeros(0, dtype=np.int64)
+
+    def cell_keys(self, cx, cy):
+        return np.asarray(cy, dtype=np.int64) * self.STRIDE + np.asarray(cx, dtype=np.int64)
+
+    def build(self, points):
+        """Sorts the points by cell.
+
+        points: array of (x, y)
+        """
+        cells = np.floor_divide(points, self.cell_size).astype(np.int64)
+        keys = self.cell_keys(cells[:, 0], cells[:, 1])
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def query(self, left, top, right, bottom):
+        """Finds the points in cells that the rectangle touches.
+
+        returns: array of point indices; some can be outside the rectangle
+        """
+        cx0, cx1 = int(left // self.cell_size), int(right // self.cell_size)
+        rows = np.arange(int(top // self.cell_size), int(bottom // self.cell_size) + 1)
+        # in each row, the cells from cx0 to cx1 are one run of keys
+        start = np.searchsorted(self.keys, self.cell_keys(cx0, rows), 'left')
+        stop = np.searchsorted(self.keys, self.cell_keys(cx1, rows), 'right')
+        if len(rows) == 1:
+            return self.order[start[0]:stop[0]]
+        return np.concatenate([self.order[a:b] for a, b in zip(start, stop)])
+
+
+class Obstacles:
+    """Obstacles that fly or scroll left and come back in from the right."""
+
+    def __init__(self, rng=None, cell_size=64):
+        """
+        rng: numpy random Generator, for respawn positions
+        cell_size: size of the collision grid cells in pixels
+        """
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.grid = SpatialGrid(cell_size)
+        self.grid_ready = False
+
+        self.pos = np.zeros((0, 2))
+        self.vel = np.zeros((0, 2))
+        self.half_size = np.zeros((0, 2))
+        self.y_range = np.zeros((0, 2))
+        # how far right of its centre an obstacle's passing edge is
+        self.pass_offset = np.zeros(0)
+        # animation: ticks per image, ticks since the last change, current image
+        self.flap_ticks = np.zeros(0, dtype=int)
+        self.anim = np.zeros(0, dtype=int)
+        self.frame = np.zeros(0, dtype=int)
+        self.images = []
+
+    def __len__(self):
+        return len(self.pos)
+
+    def add(self, images, size, y_range, speed, pass_edge='center', flap_ticks=0):
+        """Adds an obstacle at a random place off the right edge.
+
+        images: image names; with more than one, they take turns
+        size: (width, height) in pixels
+        y_range: (lowest, highest) y for the centre, inclusive
+        speed: pixels per frame at FRAME_RATE, to the left
+        pass_edge: 'center' or 'right'; the obstacle counts as passed,
+                   and comes back, when this edge reaches the balloon
+        flap_ticks: ticks between image changes
+
+        returns: index of the obstacle
+        """
+        x = self.rng.integers(SPAWN_X[0], SPAWN_X[1] + 1)
+        y = self.rng.integers(y_range[0], y_range[1] + 1)
+        half_width, half_height = size[0] / 2, size[1] / 2
+
+        self.pos = np.vstack((self.pos, [x, y]))
+        self.vel = np.vstack((self.vel, [-per_second(speed), 0]))
+        self.half_size = np.vstack((self.half_size, [half_width, half_height]))
+        self.y_range = np.vstack((self.y_range, y_range))
+        self.pass_offset = np.append(self.pass_offset, half_width if pass_edge == 'right' else 0)
+        self.flap_ticks = np.append(self.flap_ticks, flap_ticks)
+        self.anim = np.append(self.anim, 0)
+        self.frame = np.append(self.frame, 0)
+        self.images.append(tuple(images))
+        self.grid_ready = False
+        return len(self.pos) - 1
+
+    def image(self, i):
+        """Returns the current image name of obstacle i."""
+        images = self.images[i]
+        return images[self.frame[i] % len(images)]
+
+    def step(self, dt, balloon_x):
+        """Moves every obstacle, and brings back the ones that have passed the balloon.
+
+        returns: number of obstacles passed, one point each
+        """
+        passed = self.pos[:, 0] + self.pass_offset <= balloon_x
+        moving = ~passed
+
+        # masks as 0/1 factors, which is faster than indexing with them
+        self.pos += self.vel * (moving * dt)[:, np.newaxis]
+
+        # flap while moving
+        flapping = moving & (self.flap_ticks > 0)
+        self.anim += flapping
+        flip = flapping & (self.anim >= self.flap_ticks)
+        self.frame += flip
+        self.anim *= ~flip
+
+        n_passed = np.count_nonzero(passed)
+        if n_passed:
+            self.respawn(passed)
+        self.grid_ready = False
+        return n_passed
+
+    def respawn(self, mask):
+        """Puts the obstacles in mask back at random places off the right edge."""
+        n = np.count_nonzero(mask)
+        low, high = self.y_range[mask, 0], self.y_range[mask, 1]
+        self.pos[mask, 0] = self.rng.integers(SPAWN_X[0], SPAWN_X[1] + 1, size=n)
+        self.pos[mask, 1] = low + np.floor(self.rng.random(n) * (high - low + 1))
+        self.anim[mask] = 0
+
+    def hits(self, left, top, right, bottom):
+        """Finds the obstacles whose centre is inside a rectangle.
+
+        Like pygame's Rect.collidepoint, the right and bottom edges are
+        not part of the rectangle.
+
+        returns: array of obstacle indices
+        """
+        if not self.grid_ready:
+            self.grid.build(self.pos)
+            self.grid_ready = True
+        candidates = self.grid.query(left, top, right, bottom)
+        x, y = self.pos[candidates, 0], self.pos[candidates, 1]
+        inside = (x >= left) & (x < right) & (y >= top) & (y < bottom)
+        return candidates[inside]
+
+
+def benchmark(n_obstacles=500, ticks=20000, seed=0):
+    """Runs the simulation without a window and measures ticks per second.
+
+    returns: ticks per second
+    """
+    rng = np.random.default_rng(seed)
+    obstacles = Obstacles(rng)
+    for i in range(n_obstacles):
+        if i % 3 == 0:
+            obstacles.add(('bird-up', 'bird-down'), (67, 50), (10, 200), 5, flap_ticks=10)
+        else:
+            obstacles.add(('house',), (150, 140), (300, 500), 2, 'right')
+
+    # a balloon that drifts up and down
+    x, y, half_w, half_h = 400, 300, 30, 50
+    score = n_hits = 0
+    start = time.perf_counter()
+    for t in range(ticks):
+        y = 300 + 200 * np.sin(t / 100)
+        score += obstacles.step(TICK, x)
+        n_hits += len(obstacles.hits(x - half_w, y - half_h, x + half_w, y + half_h))
+    elapsed = time.perf_counter() - start
+
+    print('%d obstacles: %.0f ticks/s, %.1f us per tick (%d points, %d hits)'
+          % (n_obstacles, ticks / elapsed, elapsed / ticks * 1e6, score, n_hits))
+    return ticks / elapsed
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
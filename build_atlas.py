@@ -0,0 +1,166 @@
+"""Packs the sprites in images/ into one texture atlas.
+
+The games load each sprite from its own PNG, by name, the first time
+it is used.  This packs all of them into one image, with an index in
+images/atlas.json that gives each name its rectangle, so atlas.py can
+load one file, convert it to the display's pixel format once, and hand
+out the sprites as subsurfaces of it.
+
+The atlas is written twice: as images/atlas.rgba, the raw pixels, which
+load without any decoding (about 10 times faster than the PNGs), and as
+images/atlas.png, to look at.
+
+Sprites can be scaled to the size the game draws them at while they
+are packed, with --size, instead of resizing the PNGs one by one.
+Backgrounds that are drawn right after screen.clear() can be flattened
+onto black with --opaque; without an alpha channel they blit about 3
+times faster, and they look the same.
+
+Usage:
+
+    python build_atlas.py                          # images/ next to this file
+    python build_atlas.py path/to/images
+    python build_atlas.py --size balloon=66x100 --size bird-up=58x37
+    python build_atlas.py --opaque background --opaque stage --opaque space1
+
+Run it again when images/ changes; atlas.py skips sprites whose PNG has
+changed since the atlas was built.  The games load the atlas from the
+images/ folder that pgzero loads their sprites from.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from atlas import ATLAS_IMAGE, ATLAS_INDEX, ATLAS_PIXELS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# the same extensions that pgzero loads images from
+EXTENSIONS = (".png", ".gif", ".jpg", ".jpeg", ".bmp")
+
+# space between sprites, so no sprite bleeds into the next
+PADDING = 1
+
+
+def find_sprites(directory):
+    """Returns the image files in directory as a dictionary from name to path."""
+    sprites = {}
+    for filename in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(filename)
+        if ext.lower() in EXTENSIONS and filename != ATLAS_IMAGE:
+            sprites.setdefault(name, os.path.join(directory, filename))
+    return sprites
+
+
+def parse_size(text):
+    """Parses NAME=WxH into (name, (width, height))."""
+    name, _, size = text.partition("=")
+    width, _, height = size.partition("x")
+    return name, (int(width), int(height))
+
+
+def pack(sizes, max_width=2048):
+    """Places rectangles on shelves, tallest first.
+
+    sizes: dictionary from name to (width, height)
+    max_width: width of the atlas, unless one rectangle is wider
+
+    returns: dictionary from name to (x, y), and the (width, height) of the atlas
+    """
+    width = max([max_width] + [w + PADDING for w, h in sizes.values()])
+    positions = {}
+    x = y = shelf_height = 0
+    for name in sorted(sizes, key=lambda name: (-sizes[name][1], -sizes[name][0], name)):
+        w, h = sizes[name]
+        if x + w > width:
+            # start a new shelf under the current one
+            y += shelf_height + PADDING
+            x = shelf_height = 0
+        positions[name] = x, y
+        x += w + PADDING
+        shelf_height = max(shelf_height, h)
+    return positions, (width, y + shelf_height)
+
+
+def build_atlas(directory=None, sizes=None, opaque=(), max_width=2048):
+    """Packs the images in directory into atlas.rgba, atlas.png and atlas.json.
+
+    directory: images directory, default is images/ next to this file
+    sizes: optional dictionary from name to (width, height) to scale to
+    opaque: names of sprites to flatten onto black
+
+    returns: the index, as written to atlas.json
+    """
+    from PIL import Image
+
+    directory = directory or os.path.join(HERE, "images")
+    sizes = sizes or {}
+    sprites = find_sprites(directory)
+    unknown = (set(sizes) | set(opaque)) - set(sprites)
+    if unknown:
+        raise KeyError("no images named %s" % ", ".join(sorted(unknown)))
+
+    images = {}
+    for name, path in sprites.items():
+        image = Image.open(path).convert("RGBA")
+        if name in sizes and image.size != sizes[name]:
+            image = image.resize(sizes[name], Image.LANCZOS)
+        if name in opaque:
+            image = Image.alpha_composite(Image.new("RGBA", image.size, (0, 0, 0, 255)), image)
+        images[name] = image
+
+    positions, atlas_size = pack({name: image.size for name, image in images.items()},
+                                 max_width)
+    atlas = Image.new("RGBA", atlas_size, (0, 0, 0, 0))
+    index = dict(image=ATLAS_IMAGE, pixels=ATLAS_PIXELS, size=list(atlas_size), sprites={})
+    for name, image in images.items():
+        x, y = positions[name]
+        atlas.paste(image, (x, y))
+        stat = os.stat(sprites[name])
+        index["sprites"][name] = dict(
+            rect=[x, y, image.width, image.height],
+            # opaque sprites, like backgrounds, blit faster without alpha
+            opaque=image.getchannel("A").getextrema()[0] == 255,
+            source=os.path.basename(sprites[name]),
+            source_bytes=stat.st_size,
+        )
+
+    # write under other names first, so a crash can't leave half an
+    # atlas; the index goes last, and atlas.py goes by its time
+    pixels_file = os.path.join(directory, ATLAS_PIXELS)
+    image_file = os.path.join(directory, ATLAS_IMAGE)
+    index_file = os.path.join(directory, ATLAS_INDEX)
+    with open(pixels_file + ".tmp", "wb") as file:
+        file.write(atlas.tobytes())
+    atlas.save(image_file + ".tmp", format="PNG")
+    with open(index_file + ".tmp", "w") as file:
+        json.dump(index, file, indent=1)
+    os.replace(pixels_file + ".tmp", pixels_file)
+    os.replace(image_file + ".tmp", image_file)
+    os.replace(index_file + ".tmp", index_file)
+    return index
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Packs images/ into one texture atlas.")
+    parser.add_argument("directory", nargs="?", help="images directory")
+    parser.add_argument("--size", action="append", default=[], metavar="NAME=WxH",
+                        help="scale a sprite to this size; can be given more than once")
+    parser.add_argument("--opaque", action="append", default=[], metavar="NAME",
+                        help="flatten a sprite onto black; can be given more than once")
+    parser.add_argument("--max-width", type=int, default=2048, help="width of the atlas")
+    options = parser.parse_args(args)
+
+    sizes = dict(parse_size(text) for text in options.size)
+    index = build_atlas(options.directory, sizes, options.opaque, options.max_width)
+    width, height = index["size"]
+    used = sum(w * h for _, _, w, h in (sprite["rect"] for sprite in index["sprites"].values()))
+    print("%d sprites in a %dx%d atlas, %.0f%% used"
+          % (len(index["sprites"]), width, height, 100 * used / (width * height)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
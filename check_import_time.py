@@ -0,0 +1,98 @@
+"""Checks that `import modsim` stays within its startup budget.
+
+Runs `python -X importtime -c "import modsim"` in a fresh interpreter
+a few times, takes the best cumulative time for modsim, and exits with
+status 1 if it is over the budget, or if any of the modules that
+modsim loads lazily got imported anyway.
+
+Usage:
+
+    python check_import_time.py                # default budget, 1.5 s
+    python check_import_time.py --budget 0.8   # seconds
+    python check_import_time.py --top 15       # show the slowest imports
+
+The default budget leaves room for slow machines; the first run after
+installing pint also pays to build its unit cache.  If the check fails,
+the list of slowest imports usually shows which module went eager.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# modules that modsim should not import until a function needs them
+LAZY_MODULES = [
+    "sympy",
+    "seaborn",
+    "matplotlib.pyplot",
+    "IPython",
+    "scipy.integrate",
+    "scipy.interpolate",
+    "concurrent.futures.process",
+]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_importtime():
+    """Imports modsim in a new interpreter with -X importtime.
+
+    returns: list of (self_us, cumulative_us, module name), and the
+             list of lazy modules that were imported
+    """
+    code = "import sys, modsim; print(','.join(m for m in %r if m in sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code % LAZY_MODULES],
+        cwd=HERE,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+
+    eager = [m for m in proc.stdout.strip().split(",") if m]
+    return rows, eager
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=1.5,
+                        help="maximum import time in seconds")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="number of runs; the fastest one counts")
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of slowest imports to show")
+    options = parser.parse_args(args)
+
+    best = None
+    for _ in range(options.repeat):
+        rows, eager = run_importtime()
+        total = dict((name, cum) for _, cum, name in rows)["modsim"]
+        if best is None or total < best[0]:
+            best = total, rows, eager
+    total, rows, eager = best
+
+    print("Slowest imports (cumulative):")
+    for _, cum, name in sorted(rows, key=lambda row: row[1], reverse=True)[: options.top]:
+        print("  %8.1f ms  %s" % (cum / 1000, name))
+    print("import modsim: %.3f s (budget %.3f s)" % (total / 1e6, options.budget))
+
+    ok = True
+    if total / 1e6 > options.budget:
+        print("FAIL: import modsim is over budget")
+        ok = False
+    if eager:
+        print("FAIL: these modules should be imported lazily:", ", ".join(eager))
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,377 @@
+"""Frame-time profiler for the Pygame Zero games.
+
+Times every call of a game's draw(), update() and event handlers, and
+of every clock.schedule callback and animation, and keeps the times of
+the last few hundred calls of each in a ring buffer, and the longest
+call of all.  It can show the median (p50) and 99th percentile (p99)
+of each on the screen, and at exit it prints them and the maximum, and
+writes a trace in the Chrome trace format,
+which chrome://tracing, https://ui.perfetto.dev and speedscope show as
+a timeline or a flame graph.  Each frame is a slice, with the clock
+callbacks, update and draw nested inside it, so a dropped frame shows
+what took the time.
+
+It works by patching pgzero: PGZeroGame wraps the game's functions with
+timed versions, and the clock's tick() times each callback it fires.
+So it works for a game in a window and for pgzheadless.py alike.
+Timing each callback means doing what pgzero's Clock.tick does, so that
+is only done for the pgzero versions in TICK_VERSIONS; with any other
+version the clock's own tick() is wrapped, and only the whole tick is
+timed.
+
+Usage:
+
+    python frameprof.py balloon-flight/balloon.py                  # frameprof.json
+    python frameprof.py EE104-Lab7/red.py --overlay --trace red.json
+    python pgzheadless.py Dance-challenge/dance.py --trace dance.json
+
+or in a game, before pgzrun.go():
+
+    import frameprof
+    frameprof.install(overlay=True)
+"""
+
+import argparse
+import atexit
+import heapq
+import json
+import os
+import sys
+import time
+import types
+import warnings
+
+import numpy as np
+
+# how many calls of each hook the ring buffers keep
+HISTORY = 600
+
+# how many timed calls the trace keeps, the most recent ones
+TRACE_EVENTS = 200000
+
+# how often the overlay is redrawn, in seconds
+OVERLAY_INTERVAL = 0.5
+
+# pgzero versions whose Clock.tick callback_timing_tick() does the same as
+TICK_VERSIONS = ("1.2.1",)
+
+
+class RingBuffer:
+    """The last `size` values of a series, in a numpy array."""
+
+    def __init__(self, size=HISTORY):
+        self.values = np.zeros(size)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, len(self.values))
+
+    def append(self, value):
+        self.values[self.count % len(self.values)] = value
+        self.count += 1
+
+    def percentiles(self, q=(50, 99)):
+        """Returns the percentiles of the values kept, or NaNs if there are none."""
+        if not len(self):
+            return [np.nan] * len(q)
+        return np.percentile(self.values[:len(self)], q)
+
+
+class FrameProfiler:
+    """Times the game's hooks and keeps a trace of the calls."""
+
+    def __init__(self, history=HISTORY, trace_events=TRACE_EVENTS, overlay=False):
+        """
+        history: calls of each hook kept for the percentiles
+        trace_events: calls kept for the trace; older ones are dropped
+        overlay: whether to draw p50/p99 over the game
+        """
+        self.history = history
+        self.overlay = overlay
+        self.buffers = {}
+        self.calls = {}
+        # longest call of each hook, in ms, over the whole run
+        self.longest = {}
+        # the trace, as parallel arrays; names are indices into self.names
+        self.names = []
+        self.name_ids = {}
+        self.trace_start = np.zeros(trace_events, dtype=np.int64)
+        self.trace_duration = np.zeros(trace_events, dtype=np.int64)
+        self.trace_name = np.zeros(trace_events, dtype=np.int32)
+        self.trace_count = 0
+        self.origin = time.perf_counter_ns()
+        self.frame_start = None
+        self.overlay_lines = []
+        self.overlay_time = 0
+        self.font = None
+
+    def record(self, name, start, end):
+        """Records a call that ran from start to end, in perf_counter_ns."""
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            buffer = self.buffers[name] = RingBuffer(self.history)
+            self.calls[name] = 0
+            self.longest[name] = 0.0
+            self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        ms = (end - start) / 1e6
+        buffer.append(ms)
+        self.calls[name] += 1
+        if ms > self.longest[name]:
+            self.longest[name] = ms
+
+        i = self.trace_count % len(self.trace_start)
+        self.trace_start[i] = start - self.origin
+        self.trace_duration[i] = end - start
+        self.trace_name[i] = self.name_ids[name]
+        self.trace_count += 1
+
+    def timed(self, name, function):
+        """Wraps a function so that its calls are recorded under name."""
+        def timed_function(*args):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args)
+            finally:
+                self.record(name, start, time.perf_counter_ns())
+        return timed_function
+
+    def new_frame(self):
+        """Ends the current frame and starts the next; the clock calls this every tick."""
+        now = time.perf_counter_ns()
+        if self.frame_start is not None:
+            self.record("frame", self.frame_start, now)
+        self.frame_start = now
+
+    def restart(self):
+        """Forgets the frame in progress, e.g. between headless games."""
+        self.frame_start = None
+
+    def stats(self):
+        """Returns a list of (name, calls, p50 ms, p99 ms, max ms), frame first.
+
+        The percentiles are of the calls in the ring buffers; the maximum
+        is of all the calls.
+        """
+        rows = []
+        for name in sorted(self.buffers, key=lambda name: (name != "frame", name)):
+            p50, p99 = self.buffers[name].percentiles()
+            rows.append((name, self.calls[name], p50, p99, self.longest[name]))
+        return rows
+
+    def print_stats(self, file=None):
+        print("%-32s %8s %9s %9s %9s" % ("", "calls", "p50 ms", "p99 ms", "max ms"), file=file)
+        for name, calls, p50, p99, most in self.stats():
+            print("%-32s %8d %9.3f %9.3f %9.3f" % (name, calls, p50, p99, most), file=file)
+
+    def draw_overlay(self, surface):
+        """Draws p50/p99 of each hook in the top left corner.
+
+        The text is made again only every OVERLAY_INTERVAL seconds, so
+        the overlay costs little more than one blit per line.
+        """
+        import pygame
+
+        now = time.perf_counter()
+        if now - self.overlay_time > OVERLAY_INTERVAL:
+            self.overlay_time = now
+            if self.font is None:
+                pygame.font.init()
+                self.font = pygame.font.Font(None, 18)
+            lines = ["%-20s p50 %6.2f  p99 %6.2f ms" % (name[-20:], p50, p99)
+                     for name, _, p50, p99, _ in self.stats()]
+            self.overlay_lines = [self.font.render(line, True, (255, 255, 255), (0, 0, 0))
+                                  for line in lines]
+        y = 0
+        for line in self.overlay_lines:
+            surface.blit(line, (0, y))
+            y += line.get_height()
+
+    def trace(self):
+        """Returns the recorded calls in the Chrome trace format, oldest first."""
+        n = min(self.trace_count, len(self.trace_start))
+        first = self.trace_count - n
+        order = (np.arange(first, self.trace_count) % len(self.trace_start))
+        # by start time, longest first, so enclosing slices come before nested ones
+        order = order[np.lexsort((-self.trace_duration[order], self.trace_start[order]))]
+        pid = os.getpid()
+        # microseconds
+        starts = (self.trace_start[order] / 1e3).tolist()
+        durations = (self.trace_duration[order] / 1e3).tolist()
+        names = [self.names[i] for i in self.trace_name[order].tolist()]
+        events = [dict(name=name, ph="X", pid=pid, tid=0, ts=start, dur=duration)
+                  for name, start, duration in zip(names, starts, durations)]
+        return dict(traceEvents=events, displayTimeUnit="ms")
+
+    def dump(self, filename):
+        """Writes the trace to a JSON file."""
+        with open(filename, "w") as file:
+            json.dump(self.trace(), file)
+
+
+def callback_name(callback):
+    """Names a clock callback by its function, e.g. 'countdown' or 'Animation.update'."""
+    function = getattr(callback, "__func__", callback)
+    return getattr(function, "__qualname__", None) or repr(callback)
+
+
+def callback_timing_tick(profiler, clock):
+    """Makes a tick() for clock that times each callback it fires.
+
+    It does what pgzero.clock.Clock.tick does in the versions in
+    TICK_VERSIONS, private attributes and all.
+    """
+    def tick(dt):
+        clock.fired = False
+        clock.t += float(dt)
+
+        dead = [None]
+        for r in clock._each_tick:
+            cb = r()
+            if cb is not None:
+                clock.fired = True
+                begin = time.perf_counter_ns()
+                try:
+                    cb(dt)
+                except Exception:
+                    import traceback
+                    traceback.print_exc()
+                    dead.append(cb)
+                profiler.record(callback_name(cb), begin, time.perf_counter_ns())
+        clock._each_tick = [e for e in clock._each_tick if e() not in dead]
+
+        while clock.events and clock.events[0].time <= clock.t:
+            ev = heapq.heappop(clock.events)
+            cb = ev.callback
+            if not cb:
+                continue
+            if ev.repeat is not None:
+                clock.schedule_interval(cb, ev.repeat)
+            clock.fired = True
+            begin = time.perf_counter_ns()
+            try:
+                cb()
+            except Exception:
+                import traceback
+                traceback.print_exc()
+                clock.unschedule(cb)
+            profiler.record(callback_name(cb), begin, time.perf_counter_ns())
+    return tick
+
+
+def timed_tick(profiler, clock):
+    """Makes a tick() for clock that starts a new frame and times the tick.
+
+    With a pgzero version in TICK_VERSIONS each callback is timed too;
+    with any other, the clock's own tick() is called, and only the whole
+    tick is timed.
+    """
+    import pgzero
+
+    if pgzero.__version__ in TICK_VERSIONS:
+        tick = callback_timing_tick(profiler, clock)
+    else:
+        warnings.warn("frameprof does not know the clock of pgzero %s, so it only times "
+                      "whole ticks, not each callback" % pgzero.__version__)
+        tick = clock.tick
+
+    def timed(dt):
+        profiler.new_frame()
+        start = time.perf_counter_ns()
+        try:
+            tick(dt)
+        finally:
+            profiler.record("clock.tick", start, time.perf_counter_ns())
+    return timed
+
+
+def install(overlay=False, trace="frameprof.json", history=HISTORY, trace_events=TRACE_EVENTS,
+            report=True):
+    """Starts profiling the game that pgzero runs next.
+
+    overlay: whether to draw p50/p99 over the game
+    trace: file to write the trace to at exit, or None
+    report: whether to print the stats at exit
+
+    returns: FrameProfiler
+    """
+    import pgzero.clock
+    import pgzero.game
+
+    profiler = FrameProfiler(history, trace_events, overlay)
+    game_class = pgzero.game.PGZeroGame
+    get_update_func = game_class.get_update_func
+    get_draw_func = game_class.get_draw_func
+    prepare_handler = game_class.prepare_handler
+
+    def timed_update_func(self):
+        update = get_update_func(self)
+        return update and profiler.timed("update", update)
+
+    def timed_draw_func(self):
+        draw = profiler.timed("draw", get_draw_func(self))
+        if not profiler.overlay:
+            return draw
+
+        def draw_with_overlay():
+            draw()
+            # not part of draw's time
+            surface = pgzero.game.screen
+            if surface is not None and hasattr(surface, "blit"):
+                profiler.draw_overlay(surface)
+        return draw_with_overlay
+
+    def timed_handler(self, handler):
+        return profiler.timed(handler.__name__, prepare_handler(self, handler))
+
+    game_class.get_update_func = timed_update_func
+    game_class.get_draw_func = timed_draw_func
+    game_class.prepare_handler = timed_handler
+    clock = pgzero.clock.clock
+    clock.tick = timed_tick(profiler, clock)
+
+    def finish():
+        if report:
+            profiler.print_stats()
+        if trace:
+            profiler.dump(trace)
+            print("trace written to", trace)
+
+    atexit.register(finish)
+    return profiler
+
+
+def run(path):
+    """Runs a game in a window, like pgzrun does."""
+    import pgzero.runner
+
+    path = os.path.abspath(path)
+    with open(path) as file:
+        code = compile(file.read(), os.path.basename(path), "exec", dont_inherit=True)
+    name = os.path.splitext(os.path.basename(path))[0]
+    mod = types.ModuleType(name)
+    mod.__file__ = path
+    sys.modules[name] = mod
+    # so that the game's own pgzrun.go() does nothing
+    sys._pgzrun = True
+    pgzero.runner.prepare_mod(mod)
+    exec(code, vars(mod))
+    pgzero.runner.run_mod(mod)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Runs a Pygame Zero game with frame timing.")
+    parser.add_argument("script", help="the game's .py file")
+    parser.add_argument("--overlay", action="store_true", help="show p50/p99 on the screen")
+    parser.add_argument("--trace", default="frameprof.json", help="trace file written at exit")
+    parser.add_argument("--history", type=int, default=HISTORY,
+                        help="calls of each hook used for the percentiles")
+    options = parser.parse_args(args)
+
+    install(options.overlay, options.trace, options.history)
+    run(options.script)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,20 +18,92 @@ import sys
 if sys.version_info < (3, 6):
     logger.warning("modsim.py depends on Python 3.6 features.")
 
+import importlib
 import inspect
-import matplotlib.pyplot as plt
+import itertools
+import os
 import numpy as np
 import pandas as pd
 import scipy
-import sympy
 
-import seaborn as sns
 
-sns.set(style="white", font_scale=1.2)
+class _LazyModule:
+    """Stands in for a module that gets imported the first time it is used.
+
+    Importing sympy, seaborn, pyplot and IPython takes seconds, so we
+    put that off until a function actually needs them.
+    """
+
+    def __init__(self, name, setup=None):
+        """Save the name of the module.
+
+        name: string module name
+        setup: function called with the module right after it is imported
+        """
+        self._name = name
+        self._setup = setup
+        self._module = None
+
+    def _load(self):
+        """Imports the module, if necessary.
+
+        returns: module
+        """
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            if self._setup is not None:
+                self._setup(module)
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return "<lazy module %r (%s)>" % (self._name, state)
+
+
+def _lazy_function(module_name, name):
+    """Makes a function that imports and calls `module_name.name`.
+
+    The import happens the first time the function is called.
+
+    returns: function
+    """
+    func = None
+
+    def wrapper(*args, **kwargs):
+        nonlocal func
+        if func is None:
+            func = getattr(importlib.import_module(module_name), name)
+        return func(*args, **kwargs)
+
+    wrapper.__name__ = wrapper.__qualname__ = name
+    wrapper.__doc__ = "Calls %s.%s, which is imported on first use." % (module_name, name)
+    return wrapper
+
+
+def _set_style(plt):
+    """Applies the seaborn style the first time pyplot is used."""
+    sns.set(style="white", font_scale=1.2)
+
+
+sympy = _LazyModule("sympy")
+sns = _LazyModule("seaborn")
+plt = _LazyModule("matplotlib.pyplot", setup=_set_style)
 
 import pint
 
-UNITS = pint.UnitRegistry()
+# reuse the parsed unit definitions from the last run, if this
+# version of pint supports it; parsing them is most of the cost
+try:
+    UNITS = pint.UnitRegistry(cache_folder=":auto:")
+except TypeError:
+    UNITS = pint.UnitRegistry()
 Quantity = UNITS.Quantity
 
 # TODO: Consider making this optional
@@ -41,16 +113,20 @@ import warnings
 warnings.simplefilter("error", UnitStrippedWarning)
 
 # expose some names so we can use them without dot notation
+from collections import namedtuple
 from copy import copy
+from functools import lru_cache
 from numpy import sqrt, log, exp, pi
 from pandas import DataFrame, Series
 from time import sleep
 
-from scipy.interpolate import interp1d
-from scipy.interpolate import InterpolatedUnivariateSpline
+interp1d = _lazy_function("scipy.interpolate", "interp1d")
+InterpolatedUnivariateSpline = _lazy_function(
+    "scipy.interpolate", "InterpolatedUnivariateSpline"
+)
 
-from scipy.integrate import odeint
-from scipy.integrate import solve_ivp
+odeint = _lazy_function("scipy.integrate", "odeint")
+solve_ivp = _lazy_function("scipy.integrate", "solve_ivp")
 
 # from scipy.optimize import leastsq
 # from scipy.optimize import minimize_scalar
@@ -189,12 +265,20 @@ def magnitude(x):
 def magnitudes(x):
     """Returns the magnitude of a Quantity or number, or sequence.
 
+    Arrays, Series and Index objects that contain numbers, rather than
+    Quantities, are returned without copying.
+
     x: Quantity, number, or sequence
 
     returns: number or list or same type as x
     """
     if isinstance(x, Quantity):
         return x.magnitude
+
+    # if the dtype is not object, there can't be any Quantities inside
+    if _is_numeric_sequence(x):
+        return x.values if isinstance(x, pd.Index) else x
+
     try:
         t = [magnitude(elt) for elt in x]
 
@@ -211,6 +295,16 @@ def magnitudes(x):
         return x
 
 
+def _is_numeric_sequence(x):
+    """Checks whether x is an array, Series, or Index without Quantities.
+
+    x: any object
+
+    returns: boolean
+    """
+    return isinstance(x, (np.ndarray, pd.Series, pd.Index)) and x.dtype != object
+
+
 def get_unit(x):
     """Returns the units of a Quantity or number.
 
@@ -230,6 +324,16 @@ def get_units(x):
     """
     if isinstance(x, Quantity):
         return x.units
+
+    # if the dtype is not object, every element is unitless
+    if _is_numeric_sequence(x):
+        if x.ndim == 0:
+            return 1
+        ones = np.ones(len(x), dtype=int)
+        if isinstance(x, pd.Series):
+            return x.__class__(ones, x.index)
+        return ones
+
     try:
         t = [get_unit(elt) for elt in x]
 
@@ -270,7 +374,7 @@ def remove_units(series):
     returns: new Series object
     """
     res = copy(series)
-    for label, value in res.iteritems():
+    for label, value in res.items():
         res[label] = magnitude(value)
     return res
 
@@ -495,6 +599,51 @@ minimize = minimize_golden
 maximize = maximize_golden
 
 
+def freeze_system(system):
+    """Converts a System object to a namedtuple of plain values.
+
+    Attribute lookups on a namedtuple are much faster than on a
+    Series, so slope functions that get called many times run faster.
+    Units are dropped, and Series values, like `init`, become arrays.
+
+    system: System object
+
+    returns: namedtuple with the same names as `system`
+    """
+    values = []
+    for value in system.values:
+        value = magnitude(value)
+        if isinstance(value, Series):
+            value = np.asarray(magnitudes(value.values), dtype=np.float64)
+        values.append(value)
+    return _system_tuple_type(tuple(system.index))(*values)
+
+
+@lru_cache(maxsize=None)
+def _system_tuple_type(names):
+    """Makes (or reuses) a namedtuple type with the given field names."""
+    return namedtuple("FrozenSystem", names)
+
+
+def _jit(func):
+    """Compiles a slope function with numba, if it is installed.
+
+    func: function
+
+    returns: compiled function, or `func` if numba is not available
+    """
+    try:
+        import numba
+    except ImportError:
+        logger.warning("numba is not installed, so %s will not be compiled.",
+                       getattr(func, "__name__", func))
+        return func
+
+    if numba.extending.is_jitted(func):
+        return func
+    return numba.njit(func)
+
+
 def run_odeint(system, slope_func, **options):
     """Integrates an ordinary differential equation.
 
@@ -502,6 +651,16 @@ def run_odeint(system, slope_func, **options):
     is an array or Series that specifies the time when the
     solution will be computed.
 
+    `options` can be any legal options of `scipy.integrate.odeint`,
+    plus:
+
+    `fast=True` converts `system` to a namedtuple (see freeze_system)
+    and `init` to an array before integrating, so `slope_func` and
+    `Dfun` get those instead of Series.
+
+    `jit=True` compiles `slope_func` and `Dfun` with numba, if it is
+    installed; it only works with `fast=True`.
+
     system: System object
     slope_func: function that computes slopes
 
@@ -522,9 +681,30 @@ def run_odeint(system, slope_func, **options):
                  object that specifies the initial condition:"""
         raise ValueError(msg)
 
+    fast = options.pop("fast", False)
+    jit = options.pop("jit", False)
+    if jit and not fast:
+        msg = """`jit=True` needs `fast=True`: numba can compile
+                 slope functions that work on arrays and namedtuples,
+                 but not on Series and System objects."""
+        raise ValueError(msg)
+
+    if fast:
+        params = freeze_system(system)
+        init = params.init
+        ts = magnitudes(system.ts)
+        if jit:
+            slope_func = _jit(slope_func)
+            if options.get("Dfun") is not None:
+                options["Dfun"] = _jit(options["Dfun"])
+    else:
+        params = system
+        init = system.init
+        ts = system.ts
+
     # try running the slope function with the initial conditions
     try:
-        slope_func(system.init, system.ts[0], system)
+        slope_func(init, ts[0], params)
     except Exception as e:
         msg = """Before running scipy.integrate.odeint, I tried
                  running the slope function you provided with the
@@ -536,10 +716,10 @@ def run_odeint(system, slope_func, **options):
     # when odeint calls slope_func, it should pass `system` as
     # the third argument.  To make that work, we have to make a
     # tuple with a single element and pass the tuple to odeint as `args`
-    args = (system,)
+    args = (params,)
 
     # now we're ready to run `odeint` with `init` and `ts` from `system`
-    array = odeint(slope_func, list(system.init), system.ts, args, **options)
+    array = odeint(slope_func, list(init), ts, args, **options)
 
     # the return value from odeint is an array, so let's pack it into
     # a TimeFrame with appropriate columns and index
@@ -557,13 +737,31 @@ def run_solve_ivp(system, slope_func, **options):
 
     It can contain any other parameters required by the slope function.
 
-    `options` can be any legal options of `scipy.integrate.solve_ivp`
+    `options` can be any legal options of `scipy.integrate.solve_ivp`;
+    a `jac` function takes the same arguments as `slope_func`,
+    `(y, t, system)`, and returns the Jacobian matrix, which helps stiff
+    methods like 'Radau', 'BDF' and 'LSODA'.  Also:
+
+    `fast=True` converts `system` to a namedtuple (see freeze_system)
+    and `init` to an array before integrating, so `slope_func`, `jac`
+    and the event functions get those instead of Series.
+
+    `jit=True` compiles `slope_func` and `jac` with numba, if it is
+    installed; it only works with `fast=True`.
 
     system: System object
     slope_func: function that computes slopes
 
     returns: TimeFrame
     """
+    fast = options.pop("fast", False)
+    jit = options.pop("jit", False)
+    if jit and not fast:
+        msg = """`jit=True` needs `fast=True`: numba can compile
+                 slope functions that work on arrays and namedtuples,
+                 but not on Series and System objects."""
+        raise ValueError(msg)
+
     # make sure `system` contains `init`
     if not hasattr(system, "init"):
         msg = """It looks like `system` does not contain `init`
@@ -592,9 +790,24 @@ def run_solve_ivp(system, slope_func, **options):
         max_step = system.t_end - system.t_0 / 50
     options["max_step"] = magnitude(max_step)
 
+    if fast:
+        params = freeze_system(system)
+        init = params.init
+        if jit:
+            slope_func = _jit(slope_func)
+    else:
+        params = system
+        init = system.init
+
+    # wrap the Jacobian function like the slope function, below
+    jac = options.get("jac")
+    if callable(jac):
+        jac_func = _jit(jac) if jit else jac
+        options["jac"] = lambda t, y: jac_func(y, t, params)
+
     # try running the slope function with the initial conditions
     try:
-        slope_func(system.init, t_0, system)
+        slope_func(init, t_0, params)
     except Exception as e:
         msg = """Before running scipy.integrate.solve_ivp, I tried
                  running the slope function you provided with the
@@ -604,14 +817,14 @@ def run_solve_ivp(system, slope_func, **options):
         raise (e)
 
     # wrap the slope function to reverse the arguments and add `system`
-    f = lambda t, y: slope_func(y, t, system)
+    f = lambda t, y: slope_func(y, t, params)
 
     def wrap_event(event):
         """Wrap the event functions.
 
         Make events terminal by default.
         """
-        wrapped = lambda t, y: event(y, t, system)
+        wrapped = lambda t, y: event(y, t, params)
         wrapped.terminal = getattr(event, "terminal", True)
         wrapped.direction = getattr(event, "direction", 0)
         return wrapped
@@ -624,7 +837,7 @@ def run_solve_ivp(system, slope_func, **options):
         events = wrap_event(events)
 
     # run the solver
-    bunch = solve_ivp(f, [t_0, system.t_end], system.init, events=events, **options)
+    bunch = solve_ivp(f, [t_0, system.t_end], init, events=events, **options)
 
     # separate the results from the details
     y = bunch.pop("y")
@@ -685,7 +898,9 @@ def run_euler(system, slope_func, **options):
 
     It can contain any other parameters required by the slope function.
 
-    `options` can be ...
+    `options` can include `fast=True`, which stores the results in a
+    NumPy array and passes each state to `slope_func` as an array
+    instead of a State.  The results are the same, but units are dropped.
 
     system: System object
     slope_func: function that computes slopes
@@ -698,6 +913,9 @@ def run_euler(system, slope_func, **options):
     # get parameters from system
     init, t_0, t_end, dt = check_system(system, slope_func)
 
+    if options.get("fast", False):
+        return _run_euler_array(system, slope_func, init, t_0, t_end, dt)
+
     # make the TimeFrame
     frame = TimeFrame(columns=init.index)
     frame.row[t_0] = init
@@ -715,6 +933,36 @@ def run_euler(system, slope_func, **options):
     return frame, details
 
 
+def _run_euler_array(system, slope_func, init, t_0, t_end, dt):
+    """Array-backed version of run_euler, used when `fast=True`.
+
+    The states are stored in a preallocated NumPy array with one row
+    per time step, and `slope_func` gets each state as a row of that
+    array rather than a State object.  Units are dropped.
+
+    returns: TimeFrame, ModSimSeries
+    """
+    t_0 = magnitude(t_0)
+    dt = magnitude(dt)
+    ts = linrange(t_0, t_end, dt)
+
+    # one row for the initial conditions and one for each step
+    index = np.empty(len(ts) + 1, dtype=np.float64)
+    ys = np.empty((len(ts) + 1, len(init)), dtype=np.float64)
+    index[0] = t_0
+    ys[0] = magnitudes(init.values)
+
+    # run the solver
+    for k, t1 in enumerate(ts):
+        slopes = np.asarray(slope_func(ys[k], t1, system), dtype=np.float64)
+        ys[k + 1] = ys[k] + slopes * dt
+        index[k + 1] = t1 + dt
+
+    frame = TimeFrame(ys, index=index, columns=init.index)
+    details = ModSimSeries(dict(message="Success"))
+    return frame, details
+
+
 def run_ralston(system, slope_func, **options):
     """Computes a numerical solution to a differential equation.
 
@@ -725,7 +973,11 @@ def run_ralston(system, slope_func, **options):
 
     It can contain any other parameters required by the slope function.
 
-    `options` can be ...
+    `options` can include `events`, a function that terminates the
+    simulation when it changes sign, and `fast=True`, which stores the
+    results in a NumPy array and passes each state to `slope_func` and
+    the event function as an array instead of a State.  The results are
+    the same, but units are dropped.
 
     system: System object
     slope_func: function that computes slopes
@@ -738,12 +990,15 @@ def run_ralston(system, slope_func, **options):
     # get parameters from system
     init, t_0, t_end, dt = check_system(system, slope_func)
 
+    event_func = options.get("events", None)
+    if options.get("fast", False):
+        return _run_ralston_array(system, slope_func, init, t_0, t_end, dt, event_func)
+
     # make the TimeFrame
     frame = TimeFrame(columns=init.index)
     frame.row[t_0] = init
     ts = linrange(t_0, t_end, dt) * get_units(t_end)
 
-    event_func = options.get("events", None)
     z1 = np.nan
 
     def project(y1, t1, slopes, dt):
@@ -787,6 +1042,74 @@ def run_ralston(system, slope_func, **options):
     return frame, details
 
 
+def _run_ralston_array(system, slope_func, init, t_0, t_end, dt, event_func=None):
+    """Array-backed version of run_ralston, used when `fast=True`.
+
+    The states are stored in a preallocated NumPy array with one row
+    per time step, and `slope_func` and `event_func` get each state as
+    a NumPy array rather than a State object.  Units are dropped.
+
+    returns: TimeFrame, ModSimSeries
+    """
+    # the default message if nothing changes
+    msg = "The solver successfully reached the end of the integration interval."
+
+    t_0 = magnitude(t_0)
+    dt = magnitude(dt)
+    ts = linrange(t_0, t_end, dt)
+
+    # one row for the initial conditions and one for each step
+    index = np.empty(len(ts) + 1, dtype=np.float64)
+    ys = np.empty((len(ts) + 1, len(init)), dtype=np.float64)
+    index[0] = t_0
+    ys[0] = magnitudes(init.values)
+    n = len(index)
+
+    z1 = np.nan
+    dt_mid = 2 * dt / 3
+
+    # run the solver
+    for k, t1 in enumerate(ts):
+        y1 = ys[k]
+
+        # evaluate the slopes at the start of the time step
+        slopes1 = np.asarray(slope_func(y1, t1, system), dtype=np.float64)
+
+        # evaluate the slopes at the two-thirds point
+        y_mid = y1 + slopes1 * dt_mid
+        slopes2 = np.asarray(slope_func(y_mid, t1 + dt_mid, system), dtype=np.float64)
+
+        # compute the weighted sum of the slopes
+        slopes = (slopes1 + 3 * slopes2) / 4
+
+        # compute the next time stamp
+        y2 = y1 + slopes * dt
+        t2 = t1 + dt
+
+        # check for a terminating event
+        if event_func:
+            z2 = event_func(y2, t2, system)
+            if z1 * z2 < 0:
+                scale = magnitude(z1 / (z1 - z2))
+                y2 = y1 + slopes * (scale * dt)
+                t2 = t1 + scale * dt
+                ys[k + 1] = y2
+                index[k + 1] = t2
+                n = k + 2
+                msg = "A termination event occurred."
+                break
+            else:
+                z1 = z2
+
+        # store the results
+        ys[k + 1] = y2
+        index[k + 1] = t2
+
+    frame = TimeFrame(ys[:n], index=index[:n], columns=init.index)
+    details = ModSimSeries(dict(success=True, message=msg))
+    return frame, details
+
+
 run_ode_solver = run_ralston
 
 # TODO: Implement leapfrog
@@ -1665,6 +1988,106 @@ class SweepFrame(ModSimDataFrame):
     row_constructor = SweepSeries
 
 
+def sweep(make_system, metric, params, max_workers=None, chunksize=None):
+    """Runs a parameter sweep, spreading the runs across processes.
+
+    `params` can be a dictionary that maps from parameter names to
+    sequences of values.  Then `make_system` is called with one keyword
+    argument per name for every point in the grid.
+
+    Or `params` can be a sequence of Params objects, each of which is
+    passed to `make_system` as the only argument.
+
+    `metric` takes the System object and returns the quantity of
+    interest, usually by running a simulation.  Because they are sent
+    to worker processes, `make_system` and `metric` have to be defined
+    at the top level of a module.
+
+    make_system: function that makes a System object
+    metric: function that maps from a System to a value
+    params: dictionary of sequences, or sequence of Params
+    max_workers: number of processes, default is the number of CPUs;
+                 if 1, the runs happen in this process
+    chunksize: number of runs sent to a process at a time, default
+               is about four chunks per process
+
+    returns: SweepSeries for a sequence of Params or a grid with one
+             parameter; SweepFrame for a grid with two parameters,
+             with the first parameter as the index and the second as
+             the columns; SweepSeries with a MultiIndex for more
+    """
+    if isinstance(params, dict):
+        names = list(params)
+        values = [params[name] for name in names]
+        args = [()] * int(np.prod([len(v) for v in values]))
+        kwargs = [dict(zip(names, point)) for point in itertools.product(*values)]
+    else:
+        names = None
+        args = [(p,) for p in params]
+        kwargs = [{}] * len(args)
+
+    results = _sweep_map(make_system, metric, args, kwargs, max_workers, chunksize)
+
+    # a sequence of Params is labeled by position
+    if names is None:
+        return SweepSeries(results)
+
+    if len(names) == 1:
+        series = SweepSeries(results, values[0])
+        series.index.name = names[0]
+        return series
+
+    if len(names) == 2:
+        n = len(values[1])
+        rows = [results[i : i + n] for i in range(0, len(results), n)]
+        frame = SweepFrame(rows, index=values[0], columns=values[1])
+        frame.index.name, frame.columns.name = names
+        return frame
+
+    index = pd.MultiIndex.from_product(values, names=names)
+    return SweepSeries(results, index)
+
+
+def _sweep_run(make_system, metric, args, kwargs):
+    """Makes one System and evaluates the metric; runs in a worker."""
+    system = make_system(*args, **kwargs)
+    return metric(system)
+
+
+def _sweep_map(make_system, metric, args, kwargs, max_workers=None, chunksize=None):
+    """Runs `_sweep_run` for each set of arguments.
+
+    returns: list of results, in the same order as the arguments
+    """
+    n = len(args)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers > n:
+        max_workers = n
+
+    # not worth starting processes
+    if max_workers <= 1:
+        return [_sweep_run(make_system, metric, a, k) for a, k in zip(args, kwargs)]
+
+    if chunksize is None:
+        chunksize = -(-n // (4 * max_workers))  # round up
+
+    # importing this starts up multiprocessing, so wait until we need it
+    from concurrent.futures import ProcessPoolExecutor
+
+    # map returns results in order, regardless of which finishes first
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            _sweep_run,
+            itertools.repeat(make_system, n),
+            itertools.repeat(metric, n),
+            args,
+            kwargs,
+            chunksize=chunksize,
+        )
+        return list(results)
+
+
 def Vector(*args, units=None):
     """Make a ModSimVector.
 
@@ -1909,9 +2332,6 @@ def plot_segment(A, B, **options):
     ys = A.y, B.y
     plot(xs, ys, **options)
 
-from time import sleep
-from IPython.display import clear_output
-
 def animate(results, draw_func, interval=None):
     """Animate results from a simulation.
 
@@ -1919,6 +2339,8 @@ def animate(results, draw_func, interval=None):
     draw_func: function that draws state
     interval: time between frames in seconds
     """
+    from IPython.display import clear_output
+
     plt.figure()
     try:
         for t, state in results.iterrows():
@@ -0,0 +1,551 @@
+"""Runs the Pygame Zero games without a window, as fast as they go.
+
+balloon-flight/balloon.py, Dance-challenge/dance.py and EE104-Lab7/red.py
+normally run through pgzrun.go(), with a window, a sound card and
+unseeded `random`.  This driver runs them headless instead:
+
+- the screen is a null object that ignores all drawing, unless --draw
+  is given, in which case draw() renders into an offscreen surface;
+- pygame.mixer and the `music` builtin are null objects;
+- `random` is seeded for every game, so a seed always gives the same game;
+- time is simulated: each frame is `dt` seconds for update(dt), the
+  clock.schedule callbacks and the animations, however long the frame
+  really took;
+- input comes from a policy (random clicks and key presses by default)
+  or from a recorded log, and is delivered to on_mouse_down, on_key_up
+  etc. the same way pgzero does it.
+
+Each game runs in a fresh module, in a scratch working directory, so
+files the game writes (like high-scores.txt) don't touch the real ones.
+A game ends when one of its `game_over`/`game_complete` globals becomes
+true, or after --frames frames.
+
+An input log is JSON: the script, seed, frame time, the events as
+[frame, type, attributes], and the game's simple global variables at
+the end.  Replaying a log runs the game again with the same seed and
+input and checks that it ends in the same state.  Logs of real play,
+in a window, can be recorded with --live; they also keep the length
+of every frame.
+
+Usage:
+
+    python pgzheadless.py balloon-flight/balloon.py --games 1000
+    python pgzheadless.py EE104-Lab7/red.py --games 200 --record logs
+    python pgzheadless.py --replay logs/red-0.json
+    python pgzheadless.py Dance-challenge/dance.py --live --record logs
+    python pgzheadless.py balloon-flight/balloon.py --draw --profile
+    python pgzheadless.py balloon-flight/balloon.py --draw --trace balloon.json
+"""
+
+import argparse
+import atexit
+import contextlib
+import importlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+FRAME_RATE = 60
+
+# globals that end a game when they become true
+STOP_WHEN = ("game_over", "game_complete")
+
+EVENT_TYPES = {
+    "mouse_down": pygame.MOUSEBUTTONDOWN,
+    "mouse_up": pygame.MOUSEBUTTONUP,
+    "mouse_move": pygame.MOUSEMOTION,
+    "key_down": pygame.KEYDOWN,
+    "key_up": pygame.KEYUP,
+}
+EVENT_NAMES = {value: name for name, value in EVENT_TYPES.items()}
+
+# keys the random policy presses
+POLICY_KEYS = ("UP", "RIGHT", "DOWN", "LEFT", "W", "D", "S", "A", "SPACE")
+
+
+class Null:
+    """Stands in for the screen and the mixer: every attribute and call does nothing."""
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return None
+
+    def __bool__(self):
+        return False
+
+
+NULL = Null()
+
+
+class RandomInput:
+    """Input policy: random clicks and key presses, for whichever handlers the game has.
+
+    A press is released a few frames later, so games that watch for the
+    button or key going up see that too.
+    """
+
+    def __init__(self, rate=2.0, hold=(1, 30)):
+        """
+        rate: presses per second, on average
+        hold: (shortest, longest) press in frames
+        """
+        self.rate = rate
+        self.hold = hold
+
+    def __call__(self, game, frame, rng):
+        """Returns the events for this frame, as a list of (type, attributes)."""
+        events = []
+        releases = game.__dict__.setdefault("_headless_releases", {})
+        for release in releases.pop(frame, []):
+            events.append(release)
+        if rng.random() >= self.rate / FRAME_RATE:
+            return events
+
+        choices = []
+        if hasattr(game, "on_mouse_down") or hasattr(game, "on_mouse_up"):
+            choices.append("mouse")
+        if hasattr(game, "on_key_down") or hasattr(game, "on_key_up"):
+            choices.append("key")
+        if not choices:
+            return events
+
+        release_frame = frame + rng.randint(*self.hold)
+        if rng.choice(choices) == "mouse":
+            width, height = getattr(game, "WIDTH", 800), getattr(game, "HEIGHT", 600)
+            attrs = {"pos": [rng.randrange(width), rng.randrange(height)], "button": 1}
+            events.append(("mouse_down", attrs))
+            releases.setdefault(release_frame, []).append(("mouse_up", attrs))
+        else:
+            key = getattr(pygame, "K_" + rng.choice(POLICY_KEYS).lower(), None)
+            if key is None:
+                return events
+            attrs = {"key": key, "mod": 0, "unicode": ""}
+            events.append(("key_down", attrs))
+            releases.setdefault(release_frame, []).append(("key_up", attrs))
+        return events
+
+
+def load_policy(spec):
+    """Imports a policy given as "module:function"."""
+    module_name, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), name or "policy")
+
+
+def make_event(type_name, attrs):
+    """Makes a pygame event from a logged (type, attributes) pair."""
+    attrs = dict(attrs)
+    for name in ("pos", "rel"):
+        if name in attrs:
+            attrs[name] = tuple(attrs[name])
+    if "buttons" in attrs:
+        attrs["buttons"] = tuple(attrs["buttons"])
+    return pygame.event.Event(EVENT_TYPES[type_name], attrs)
+
+
+def event_attrs(event):
+    """Returns the attributes of a pygame event that handlers can ask for, for the log."""
+    attrs = {}
+    for name in ("pos", "rel", "button", "buttons", "key", "mod", "unicode"):
+        if hasattr(event, name):
+            value = getattr(event, name)
+            attrs[name] = list(value) if isinstance(value, tuple) else value
+    return attrs
+
+
+def find_root(path):
+    """Finds the directory with the images/ for a script: its own, or the nearest above it."""
+    directory = os.path.dirname(os.path.abspath(path))
+    while True:
+        if os.path.isdir(os.path.join(directory, "images")):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return os.path.dirname(os.path.abspath(path))
+        directory = parent
+
+
+def game_state(game):
+    """Returns the game's global numbers, strings and flags, for comparing runs."""
+    state = {}
+    for name, value in vars(game).items():
+        if name.startswith("_") or name.isupper():
+            continue
+        # numpy scalars, like a score added up from numpy counts
+        if type(value).__module__ == "numpy" and hasattr(value, "item"):
+            value = value.item()
+        if isinstance(value, (bool, int, float, str)):
+            state[name] = value
+    return state
+
+
+def reset_pgzero():
+    """Clears what pgzero keeps between games: the clock, animations and keys."""
+    import pgzero.animation
+    import pgzero.clock
+    import pgzero.keyboard
+
+    clock = pgzero.clock.clock
+    clock.t = 0
+    clock.fired = False
+    clock.events = []
+    clock._each_tick = []
+    pgzero.animation.Animation.animations.clear()
+    pgzero.animation.Animation._animation_dict.clear()
+    pgzero.keyboard.keyboard._pressed.clear()
+
+
+class Simulator:
+    """Runs one Pygame Zero script headless, many times."""
+
+    def __init__(self, path, draw=False, workdir=None, profiler=None):
+        """
+        path: the game's .py file
+        draw: whether to call draw() every frame, into an offscreen surface
+        workdir: working directory for the games, default is a new
+                 temporary one
+        profiler: frameprof.FrameProfiler, if frameprof is installed
+        """
+        # no window or sound card; SDL reads these when the display starts
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        import pgzero.loaders
+
+        self.path = os.path.abspath(path)
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.draw = draw
+        self.profiler = profiler
+        with open(self.path) as file:
+            self.code = compile(file.read(), self.path, "exec", dont_inherit=True)
+
+        pygame.display.init()
+        pygame.font.init()
+        # images are converted for the display, so there has to be one
+        self.surface = pygame.display.set_mode((100, 100))
+        pgzero.loaders.set_root(find_root(self.path))
+        # for the script's own modules, like world.py
+        sys.path.insert(0, os.path.dirname(self.path))
+
+        self.spellchecked = False
+        self.own_workdir = workdir is None
+        self.workdir = tempfile.mkdtemp(prefix="pgzheadless-") if workdir is None else workdir
+
+    def close(self):
+        if self.own_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def sandbox(self, exit_handlers):
+        """Nulls the mixer, makes pgzrun.go() do nothing and collects atexit handlers."""
+        import pgzero.spellcheck
+
+        saved = (pygame.mixer.init, pygame.mixer.music, atexit.register, os.getcwd(),
+                 getattr(sys, "_pgzrun", None), pgzero.spellcheck.spellcheck)
+        pygame.mixer.init = NULL
+        pygame.mixer.music = NULL
+        sys._pgzrun = True
+        # the names don't change between games, so warn about typos once
+        if self.spellchecked:
+            pgzero.spellcheck.spellcheck = NULL
+        self.spellchecked = True
+
+        def register(function, *args, **kwargs):
+            exit_handlers.append((function, args, kwargs))
+            return function
+
+        atexit.register = register
+        os.chdir(self.workdir)
+        try:
+            yield
+        finally:
+            (pygame.mixer.init, pygame.mixer.music, atexit.register, cwd, pgzrun,
+             pgzero.spellcheck.spellcheck) = saved
+            os.chdir(cwd)
+            sys._pgzrun = pgzrun
+
+    def make_game(self):
+        """Runs the script's top level in a new module."""
+        import pgzero.builtins
+        import pgzero.game
+        import pgzero.screen
+
+        game = types.ModuleType(self.name)
+        game.__file__ = self.path
+        vars(game).update(vars(pgzero.builtins))
+        game.music = NULL
+        if self.draw:
+            game.screen = pgzero.screen.Screen(self.surface)
+            pgzero.game.screen = self.surface
+        else:
+            game.screen = NULL
+            pgzero.game.screen = NULL
+        exec(self.code, vars(game))
+
+        if self.draw:
+            # the game may have set the display mode itself, like balloon.py
+            size = (getattr(game, "WIDTH", 800), getattr(game, "HEIGHT", 600))
+            self.surface = pygame.display.get_surface()
+            if self.surface.get_size() != size:
+                self.surface = pygame.display.set_mode(size)
+            game.screen.surface = self.surface
+            pgzero.game.screen = self.surface
+        return game
+
+    def run(self, seed=0, frames=None, dt=1 / FRAME_RATE, policy=None, events=None, dts=None,
+            stop_when=STOP_WHEN):
+        """Plays one game.
+
+        seed: seed for `random`
+        frames: most frames to run; default is five minutes, or the
+                length of dts
+        dt: seconds per frame
+        policy: function (game, frame, rng) that returns the input for a
+                frame as a list of (type, attributes); default is RandomInput()
+        events: recorded input as [frame, type, attributes], instead of a policy
+        dts: recorded length of every frame, instead of dt
+        stop_when: names of globals that end the game when they become true
+
+        returns: log of the game, a dictionary that replay() can run again
+        """
+        import pgzero.clock
+        import pgzero.game
+        import pgzero.keyboard
+
+        if frames is None:
+            frames = len(dts) if dts is not None else 5 * 60 * FRAME_RATE
+        if events is None and policy is None:
+            policy = RandomInput()
+        pending = {}
+        for frame, type_name, attrs in events or []:
+            pending.setdefault(frame, []).append((type_name, attrs))
+        input_rng = random.Random("input-%d" % seed)
+        logged = []
+
+        exit_handlers = []
+        with self.sandbox(exit_handlers):
+            reset_pgzero()
+            random.seed(seed)
+            game = self.make_game()
+            if self.profiler is not None:
+                # setting up the game isn't a frame
+                self.profiler.restart()
+            runner = pgzero.game.PGZeroGame(game)
+            runner.load_handlers()
+            update = runner.get_update_func()
+            draw = runner.get_draw_func() if self.draw else None
+            keyboard = pgzero.keyboard.keyboard
+            clock = pgzero.clock.clock
+
+            frame = 0
+            try:
+                while frame < frames and not any(getattr(game, name, False) for name in stop_when):
+                    if policy is not None:
+                        frame_events = policy(game, frame, input_rng)
+                    else:
+                        frame_events = pending.get(frame, [])
+                    for type_name, attrs in frame_events:
+                        logged.append([frame, type_name, attrs])
+                        event = make_event(type_name, attrs)
+                        if event.type == pygame.KEYDOWN:
+                            keyboard._press(event.key)
+                        elif event.type == pygame.KEYUP:
+                            keyboard._release(event.key)
+                        runner.dispatch_event(event)
+
+                    frame_dt = dts[frame] if dts is not None else dt
+                    clock.tick(frame_dt)
+                    if update:
+                        update(frame_dt)
+                    if draw:
+                        draw()
+                    frame += 1
+            finally:
+                # the game's atexit handlers run when the game ends
+                for function, args, kwargs in reversed(exit_handlers):
+                    function(*args, **kwargs)
+
+        log = dict(script=os.path.relpath(self.path), seed=seed, dt=dt, frames=frame,
+                   events=logged, state=game_state(game))
+        if dts is not None:
+            log["dts"] = list(dts[:frame])
+        return log
+
+
+def replay(log, draw=False):
+    """Plays a logged game again.
+
+    returns: list of the global variables whose end values differ, as
+             (name, logged value, replayed value)
+    """
+    simulator = Simulator(log["script"], draw=draw)
+    try:
+        result = simulator.run(log["seed"], log["frames"], log["dt"], events=log["events"],
+                               dts=log.get("dts"), stop_when=())
+    finally:
+        simulator.close()
+    expected, actual = log["state"], result["state"]
+    return [(name, expected.get(name), actual.get(name))
+            for name in sorted(set(expected) | set(actual))
+            if expected.get(name) != actual.get(name)]
+
+
+def record_live(path, seed=0):
+    """Plays the game for real, in a window, and logs the input and the frame times.
+
+    returns: log of the game
+    """
+    import pgzero.clock
+    import pgzero.game
+    import pgzero.runner
+
+    path = os.path.abspath(path)
+    with open(path) as file:
+        code = compile(file.read(), os.path.basename(path), "exec", dont_inherit=True)
+    game = types.ModuleType(os.path.splitext(os.path.basename(path))[0])
+    game.__file__ = path
+    sys._pgzrun = True
+    pgzero.runner.prepare_mod(game)
+
+    # events go out before the clock ticks, so the frame of an event is
+    # the number of ticks so far
+    dts, logged = [], []
+    clock = pgzero.clock.clock
+    tick = clock.tick
+
+    def timed_tick(dt):
+        dts.append(dt)
+        tick(dt)
+
+    dispatch_event = pgzero.game.PGZeroGame.dispatch_event
+
+    def logged_dispatch(self, event):
+        if event.type in EVENT_NAMES:
+            logged.append([len(dts), EVENT_NAMES[event.type], event_attrs(event)])
+        dispatch_event(self, event)
+
+    clock.tick = timed_tick
+    pgzero.game.PGZeroGame.dispatch_event = logged_dispatch
+    random.seed(seed)
+    try:
+        exec(code, vars(game))
+        pgzero.runner.run_mod(game)
+    except SystemExit:
+        pass
+    finally:
+        clock.tick = tick
+        pgzero.game.PGZeroGame.dispatch_event = dispatch_event
+
+    return dict(script=os.path.relpath(path), seed=seed, dt=1 / FRAME_RATE, frames=len(dts),
+                events=logged, state=game_state(game), dts=dts)
+
+
+def save_log(log, directory):
+    """Writes a log as <script>-<seed>.json in directory and returns the file name."""
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.splitext(os.path.basename(log["script"]))[0]
+    filename = os.path.join(directory, "%s-%d.json" % (name, log["seed"]))
+    with open(filename, "w") as file:
+        json.dump(log, file)
+    return filename
+
+
+def summarize(logs, elapsed):
+    """Prints how fast the games ran and the range of their end values."""
+    frames = sum(log["frames"] for log in logs)
+    print("%d games, %d frames in %.1f s: %.0f games/min, %.0f frames/s, %.1f us/frame"
+          % (len(logs), frames, elapsed, len(logs) / elapsed * 60, frames / elapsed,
+             elapsed / max(frames, 1) * 1e6))
+    print("%-20s %10s %10s %10s" % ("", "mean", "min", "max"))
+    lengths = [log["frames"] / FRAME_RATE for log in logs]
+    print("%-20s %10.2f %10.2f %10.2f" % ("seconds", sum(lengths) / len(lengths),
+                                          min(lengths), max(lengths)))
+    names = sorted(set().union(*(log["state"] for log in logs)))
+    for name in names:
+        values = [log["state"].get(name) for log in logs]
+        if all(isinstance(value, (bool, int, float)) for value in values):
+            print("%-20s %10.2f %10.2f %10.2f" % (name, sum(values) / len(values),
+                                                  min(values), max(values)))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Runs a Pygame Zero game headless.")
+    parser.add_argument("script", nargs="?", help="the game's .py file")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--frames", type=int, help="most frames per game, default 5 minutes")
+    parser.add_argument("--rate", type=float, default=2.0,
+                        help="presses per second for the random input")
+    parser.add_argument("--policy", help="input policy as module:function")
+    parser.add_argument("--draw", action="store_true", help="call draw() every frame")
+    parser.add_argument("--record", metavar="DIR", help="save a log of every game in DIR")
+    parser.add_argument("--replay", nargs="+", metavar="LOG", help="replay logged games")
+    parser.add_argument("--live", action="store_true",
+                        help="play one game in a window and record it")
+    parser.add_argument("--profile", action="store_true", help="profile the games with cProfile")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="time the game's hooks with frameprof and write a trace to FILE")
+    options = parser.parse_args(args)
+
+    if options.replay:
+        failed = 0
+        for filename in options.replay:
+            with open(filename) as file:
+                differences = replay(json.load(file), options.draw)
+            print("%s: %s" % (filename, "differs" if differences else "same"))
+            for name, expected, actual in differences:
+                print("  %s: %r, replayed %r" % (name, expected, actual))
+            failed += bool(differences)
+        return 1 if failed else 0
+
+    if not options.script:
+        parser.error("give a script, or --replay")
+
+    if options.live:
+        log = record_live(options.script, options.seed)
+        print(save_log(log, options.record or "."))
+        return 0
+
+    policy = load_policy(options.policy) if options.policy else RandomInput(options.rate)
+    frame_profiler = None
+    if options.trace:
+        import frameprof
+        frame_profiler = frameprof.install(trace=options.trace)
+    simulator = Simulator(options.script, draw=options.draw, profiler=frame_profiler)
+    profiler = None
+    if options.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    logs = []
+    start = time.perf_counter()
+    try:
+        for seed in range(options.seed, options.seed + options.games):
+            log = simulator.run(seed, options.frames, policy=policy)
+            logs.append(log)
+            if options.record:
+                save_log(log, options.record)
+    finally:
+        elapsed = time.perf_counter() - start
+        simulator.close()
+
+    if profiler is not None:
+        import pstats
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    summarize(logs, elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
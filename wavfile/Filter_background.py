@@ -1,63 +1,126 @@
-import matplotlib.pyplot as plt
-import numpy as np
-import wave
-import sys
-import math
-import contextlib
- 
-fname = 'h1.wav'
-outname = 'h1_filter.wav'
- 
-cutOffFrequency = 400.0
- 
-# from http://stackoverflow.com/questions/13728392/moving-average-or-running-mean
-def running_mean(x, windowSize):
-  cumsum = np.cumsum(np.insert(x, 0, 0))
-  return (cumsum[windowSize:] - cumsum[:-windowSize]) / windowSize
- 
-# from http://stackoverflow.com/questions/2226853/interpreting-wav-data/2227174#2227174
-def interpret_wav(raw_bytes, n_frames, n_channels, sample_width, interleaved = True):
- 
-    if sample_width == 1:
-        dtype = np.uint8 # unsigned char
-    elif sample_width == 2:
-        dtype = np.int16 # signed 2-byte short
-    else:
-        raise ValueError("Only supports 8 and 16 bit audio formats.")
- 
-    channels = np.fromstring(raw_bytes, dtype=dtype)
- 
-    if interleaved:
-        # channels are interleaved, i.e. sample N of channel M follows sample N of channel M-1 in raw data
-        channels.shape = (n_frames, n_channels)
-        channels = channels.T
-    else:
-        # channels are not interleaved. All samples from channel M occur before all samples from channel M-1
-        channels.shape = (n_channels, n_frames)
- 
-    return channels
- 
-with contextlib.closing(wave.open(fname,'rb')) as spf:
-    sampleRate = spf.getframerate()
-    ampWidth = spf.getsampwidth()
-    nChannels = spf.getnchannels()
-    nFrames = spf.getnframes()
- 
-    # Extract Raw Audio from multi-channel Wav File
-    signal = spf.readframes(nFrames*nChannels)
-    spf.close()
-    channels = interpret_wav(signal, nFrames, nChannels, ampWidth, True)
- 
-    # get window size
-    # from http://dsp.stackexchange.com/questions/9966/what-is-the-cut-off-frequency-of-a-moving-average-filter
-    freqRatio = (cutOffFrequency/sampleRate)
-    N = int(math.sqrt(0.196196 + freqRatio**2)/freqRatio)
- 
-    # Use moviung average (only on first channel)
-    filtered = running_mean(channels[0], N).astype(channels.dtype)
- 
-    wav_file = wave.open(outname, "w")
-    wav_file.setparams((1, ampWidth, sampleRate, nFrames, spf.getcomptype(), spf.getcompname()))
-    wav_file.writeframes(filtered.tobytes('C'))
-    wav_file.close()
-    
+import numpy as np
+import wave
+import sys
+import math
+import contextlib
+
+fname = 'h1.wav'
+outname = 'h1_filter.wav'
+
+cutOffFrequency = 400.0
+
+# number of frames read, filtered and written at a time
+blockFrames = 65536
+
+# from http://stackoverflow.com/questions/13728392/moving-average-or-running-mean
+def running_mean(x, windowSize):
+  cumsum = np.cumsum(np.insert(x, 0, 0))
+  return (cumsum[windowSize:] - cumsum[:-windowSize]) / windowSize
+
+# from http://stackoverflow.com/questions/2226853/interpreting-wav-data/2227174#2227174
+def interpret_wav(raw_bytes, n_frames, n_channels, sample_width, interleaved = True):
+
+    if sample_width == 1:
+        dtype = np.uint8 # unsigned char
+    elif sample_width == 2:
+        dtype = np.int16 # signed 2-byte short
+    else:
+        raise ValueError("Only supports 8 and 16 bit audio formats.")
+
+    # a read-only view of raw_bytes, no copy
+    channels = np.frombuffer(raw_bytes, dtype=dtype)
+
+    if interleaved:
+        # channels are interleaved, i.e. sample N of channel M follows sample N of channel M-1 in raw data
+        channels.shape = (n_frames, n_channels)
+        channels = channels.T
+    else:
+        # channels are not interleaved. All samples from channel M occur before all samples from channel M-1
+        channels.shape = (n_channels, n_frames)
+
+    return channels
+
+# from http://dsp.stackexchange.com/questions/9966/what-is-the-cut-off-frequency-of-a-moving-average-filter
+def window_size(cutOffFrequency, sampleRate):
+    freqRatio = (cutOffFrequency/sampleRate)
+    return int(math.sqrt(0.196196 + freqRatio**2)/freqRatio)
+
+class RunningMean:
+    """Moving average over blocks of a longer signal.
+
+    Keeps the last windowSize-1 samples of each channel, so filtering
+    the blocks one at a time gives the same output as running_mean on
+    the whole signal: one value for every full window.
+    """
+
+    def __init__(self, windowSize, n_channels):
+        self.windowSize = windowSize
+        self.history = np.zeros((n_channels, 0))
+
+    def process(self, block):
+        """Filters one block with shape (n_channels, n_frames).
+
+        Returns an array with shape (n_channels, n_out), where n_out
+        can be smaller than n_frames until the first window fills up.
+        """
+        x = np.concatenate((self.history, block), axis=1)
+        cumsum = np.cumsum(x, axis=1)
+        cumsum = np.insert(cumsum, 0, 0, axis=1)
+        N = self.windowSize
+        filtered = (cumsum[:, N:] - cumsum[:, :-N]) / N
+
+        # carry the start of the next window over to the next block
+        keep = min(N - 1, x.shape[1])
+        self.history = x[:, x.shape[1] - keep:]
+        return filtered
+
+def iter_wav_blocks(spf, blockFrames=blockFrames):
+    """Reads an open wave file one block at a time.
+
+    Yields arrays with shape (n_channels, n_frames); every block has
+    blockFrames frames except maybe the last.
+    """
+    ampWidth = spf.getsampwidth()
+    nChannels = spf.getnchannels()
+    while True:
+        raw = spf.readframes(blockFrames)
+        n = len(raw) // (ampWidth * nChannels)
+        if n == 0:
+            break
+        yield interpret_wav(raw[:n * ampWidth * nChannels], n, nChannels, ampWidth, True)
+
+def filter_wav(fname, outname, cutOffFrequency, blockFrames=blockFrames):
+    """Applies a moving average to every channel of a wave file.
+
+    The file is processed one block at a time, so memory use does not
+    depend on the length of the recording.
+
+    Returns the number of frames written.
+    """
+    with contextlib.closing(wave.open(fname,'rb')) as spf:
+        sampleRate = spf.getframerate()
+        ampWidth = spf.getsampwidth()
+        nChannels = spf.getnchannels()
+        nFrames = spf.getnframes()
+
+        N = window_size(cutOffFrequency, sampleRate)
+        mean = RunningMean(N, nChannels)
+        nOut = max(nFrames - N + 1, 0)
+        written = 0
+
+        with contextlib.closing(wave.open(outname, "wb")) as wav_file:
+            wav_file.setparams((nChannels, ampWidth, sampleRate, nOut, spf.getcomptype(), spf.getcompname()))
+            for channels in iter_wav_blocks(spf, blockFrames):
+                filtered = mean.process(channels).astype(channels.dtype)
+                # interleave the channels again
+                wav_file.writeframes(filtered.T.tobytes('C'))
+                written += filtered.shape[1]
+
+    return written
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        fname = sys.argv[1]
+    if len(sys.argv) > 2:
+        outname = sys.argv[2]
+    filter_wav(fname, outname, cutOffFrequency)
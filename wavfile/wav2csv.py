@@ -2,45 +2,144 @@
 """
 BMCL BAEKSUWHAN
 @author: lukious
+
+Converts a .wav file to a binary .npy (default) or .npz file, or to
+.csv files for tools that need text.
+
+The .wav file is memory-mapped and copied over in chunks, so the whole
+recording is never loaded at once.  The .npy file comes with a .json
+file that records the sample rate; the .npz file holds the samples as
+`samples` and the sample rate as `rate`.  Use load_samples() to read
+any of these back (.npy files are memory-mapped too).
+
+Usage:
+
+    python wav2csv.py h1_filter.wav                  # h1_filter.npy + h1_filter.json
+    python wav2csv.py h1_filter.wav --format npz     # h1_filter.npz
+    python wav2csv.py h1_filter.wav --format csv     # h1_filter_Output_mono.csv
+    python wav2csv.py h1_filter.wav --output ../EE104-Lab7/h1_filter
 """
 
-import sys, os, os.path
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
 from scipy.io import wavfile
-import pandas as pd
 
-input_filename = input("Input file number:")
-if input_filename[-3:] != 'wav':
-    print('WARNING!! Input File format should be *.wav')
-    sys.exit()
+# number of frames copied at a time
+CHUNK_FRAMES = 1 << 20
+
+
+def convert_npy(samrate, data, stem, chunk_frames=CHUNK_FRAMES):
+    """Writes the samples to stem.npy and the metadata to stem.json.
+
+    returns: list of file names
+    """
+    npy_name = stem + '.npy'
+    out = np.lib.format.open_memmap(npy_name, mode='w+', dtype=data.dtype, shape=data.shape)
+    for start in range(0, len(data), chunk_frames):
+        out[start:start + chunk_frames] = data[start:start + chunk_frames]
+    out.flush()
+    del out
+
+    json_name = stem + '.json'
+    meta = dict(rate=int(samrate), channels=1 if data.ndim == 1 else data.shape[1],
+                frames=len(data), dtype=data.dtype.str)
+    with open(json_name, 'w') as file:
+        json.dump(meta, file)
+    return [npy_name, json_name]
+
+
+def convert_npz(samrate, data, stem):
+    """Writes the samples and sample rate to stem.npz.
+
+    returns: list of file names
+    """
+    npz_name = stem + '.npz'
+    np.savez(npz_name, samples=data, rate=np.int64(samrate))
+    return [npz_name]
+
+
+def convert_csv(samrate, data, stem, chunk_frames=CHUNK_FRAMES):
+    """Writes the samples as text, one file per channel for stereo.
+
+    The files have one sample per line and no header, which is what
+    heartpy.get_data expects.
+
+    returns: list of file names
+    """
+    fmt = '%d' if data.dtype.kind in 'iu' else '%.9g'
+
+    if data.ndim == 1:
+        columns = {stem + '_Output_mono.csv': data}
+    elif data.shape[1] == 2:
+        columns = {stem + '_Output_stereo_R.csv': data[:, 0],
+                   stem + '_Output_stereo_L.csv': data[:, 1]}
+    else:
+        columns = {stem + 'Output_multi_channel.csv': data}
+
+    for name, values in columns.items():
+        with open(name, 'w') as file:
+            for start in range(0, len(values), chunk_frames):
+                np.savetxt(file, values[start:start + chunk_frames], fmt=fmt, delimiter=',')
+    return list(columns)
+
+
+def load_samples(filename):
+    """Reads samples written by this script, or a .wav file.
+
+    .npy and .wav files are memory-mapped.
+
+    returns: sample rate (or None if unknown), array of samples
+    """
+    stem, ext = os.path.splitext(filename)
+    ext = ext.lower()
+    if ext == '.npy':
+        data = np.load(filename, mmap_mode='r')
+        samrate = None
+        if os.path.exists(stem + '.json'):
+            with open(stem + '.json') as file:
+                samrate = json.load(file)['rate']
+        return samrate, data
+    if ext == '.npz':
+        with np.load(filename) as npz:
+            return int(npz['rate']), npz['samples']
+    if ext == '.wav':
+        return wavfile.read(filename, mmap=True)
+    if ext == '.csv':
+        return None, np.loadtxt(filename, delimiter=',', ndmin=1)
+    raise ValueError('Unknown file type: ' + filename)
 
-samrate, data = wavfile.read(str('C:/Users/jlong/Documents/Spring 2022/EE 104/Lab7/wavfile/' + input_filename))
-print('Load is Done! \n')
 
-wavData = pd.DataFrame(data)
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Convert a .wav file to .npy, .npz or .csv.')
+    parser.add_argument('input', help='.wav file to convert')
+    parser.add_argument('--format', choices=['npy', 'npz', 'csv'], default='npy',
+                        help='output format (default: npy)')
+    parser.add_argument('--output', help='output file name without extension; csv adds '
+                        '_Output_mono or _Output_stereo_R/_L to it (default: same as the input)')
+    options = parser.parse_args(args)
 
-if len(wavData.columns) == 2:
-    print('Stereo .wav file\n')
-    wavData.columns = ['R', 'L']
-    stereo_R = pd.DataFrame(wavData['R'])
-    stereo_L = pd.DataFrame(wavData['L'])
-    print('Saving...\n')
-    stereo_R.to_csv(str(input_filename[:-4] + "_Output_stereo_R.csv"), mode='w')
-    stereo_L.to_csv(str(input_filename[:-4] + "_Output_stereo_L.csv"), mode='w')
-    # wavData.to_csv("Output_stereo_RL.csv", mode='w')
-    print('Save is done ' + str(input_filename[:-4]) + '_Output_stereo_R.csv , '
-                          + str(input_filename[:-4]) + '_Output_stereo_L.csv')
+    if not options.input.lower().endswith('.wav'):
+        print('WARNING!! Input File format should be *.wav')
+        return 1
 
-elif len(wavData.columns) == 1:
-    print('Mono .wav file\n')
-    wavData.columns = ['M']
+    samrate, data = wavfile.read(options.input, mmap=True)
+    print('Load is Done! \n')
 
-    wavData.to_csv(str(input_filename[:-4] + "_Output_mono.csv"), mode='w')
+    stem = options.output or os.path.splitext(options.input)[0]
+    if options.format == 'npy':
+        names = convert_npy(samrate, data, stem)
+    elif options.format == 'npz':
+        names = convert_npz(samrate, data, stem)
+    else:
+        names = convert_csv(samrate, data, stem)
 
-    print('Save is done ' + str(input_filename[:-4]) + '_Output_mono.csv')
+    print('Save is done ' + ' , '.join(names))
+    return 0
 
-else:
-    print('Multi channel .wav file\n')
-    print('number of channel : ' + len(wavData.columns) + '\n')
-    wavData.to_csv(str(input_filename[:-4] + "Output_multi_channel.csv"), mode='w')
 
-    print('Save is done ' + str(input_filename[:-4]) + 'Output_multi_channel.csv')
+if __name__ == '__main__':
+    sys.exit(main())